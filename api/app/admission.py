@@ -0,0 +1,226 @@
+from flask import Response, request, g
+from functools import wraps
+from typing import Callable, Dict, Optional
+from threading import Lock
+from time import time
+from app.serialize import dumps
+
+# The number of requests to each route that can be handled at once, keyed by
+# the name of the function that handles the route. Routes that aren't listed
+# aren't limited, which is the case for cheap lookups like `/agent/<cui>`.
+DEFAULT_CONCURRENCY_LIMITS: Dict[str, int] = {
+    "get_interaction": 8,
+    "get_agent_interactions": 4,
+    "get_agent_two_hop_neighbors": 4,
+    "get_shared_neighbors": 4,
+    "get_paper": 8,
+    "export": 2,
+}
+
+
+# The total cost of the requests that can be handled at once, see
+# `InteractionIndex.get_agent_cost`.
+DEFAULT_MAX_COST = 200000
+
+# How long a request can take, including the time it spent waiting to be
+# handled, before we give up on it.
+DEFAULT_DEADLINE_SECONDS = 10.0
+
+
+class Overloaded(Exception):
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def no_checkpoint() -> None:
+    pass
+
+
+class Deadline:
+    """
+    The time by which a request should be handled. Routes that do a lot of
+    work should call `check()` periodically, which lets other requests be
+    handled (see `AdmissionControl`) and gives up on the request once it's
+    too late for the response to be useful.
+    """
+
+    def __init__(
+        self,
+        expires_at: Optional[float],
+        checkpoint: Callable[[], None] = no_checkpoint,
+    ):
+        self.expires_at = expires_at
+        self.checkpoint = checkpoint
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time() > self.expires_at
+
+    def check(self) -> None:
+        self.checkpoint()
+        if self.expired():
+            raise DeadlineExceeded()
+
+
+def current_deadline() -> Deadline:
+    """
+    Returns the deadline of the current request, if it has one.
+    """
+    return g.get("deadline", Deadline(None))
+
+
+class Ticket:
+    """
+    A request that was admitted, and the cost that was reserved for it.
+    """
+
+    def __init__(self, route: str, cost: int, deadline: Deadline):
+        self.route = route
+        self.cost = cost
+        self.deadline = deadline
+        self.released = False
+
+
+class AdmissionControl:
+    """
+    Decides whether a request is handled, based on the work that's already in
+    progress. Requests are rejected right away rather than queued, so that a
+    burst of expensive requests doesn't delay everything else:
+
+    - Each route can have a limit on the number of requests to it that are
+      handled at once.
+    - Each request has a cost, which estimates how much work it is. The total
+      cost of the requests that are in progress is limited. A request that
+      costs more than the limit on its own is only admitted when nothing else
+      is in progress, so that it can eventually be handled.
+    - Each request has a deadline, measured from when it was received by the
+      proxy (if it tells us) or the API. Requests that waited until after
+      their deadline to be handled are rejected.
+
+    In production requests are handled by greenlets (see `app.start`), which
+    only switch when one of them waits. The routes don't wait on anything,
+    so without help each request would run to completion before the next
+    one is even read, and nothing would ever be in progress at the same
+    time. The checkpoint is called when a request is admitted and each time
+    a route checks its deadline, and should yield to other greenlets until
+    any pending IO is handled (i.e. `gevent.idle`, as `gevent.sleep(0)` only
+    yields to greenlets that are already runnable, not to new requests).
+    That's what lets requests be handled at once, and so what the limits
+    apply to.
+    """
+
+    def __init__(
+        self,
+        concurrency_limits: Dict[str, int],
+        max_cost: int,
+        deadline_seconds: Optional[float],
+        retry_after: int = 1,
+        checkpoint: Callable[[], None] = no_checkpoint,
+    ):
+        self.concurrency_limits = concurrency_limits
+        self.max_cost = max_cost
+        self.deadline_seconds = deadline_seconds
+        self.retry_after = retry_after
+        self.checkpoint = checkpoint
+        self.in_progress: Dict[str, int] = {}
+        self.cost = 0
+        self.lock = Lock()
+
+    def admit(self, route: str, cost: int, received_at: float) -> Ticket:
+        """
+        Reserves capacity for a request, or raises an Overloaded exception if
+        there isn't enough.
+        """
+        expires_at = (
+            received_at + self.deadline_seconds
+            if self.deadline_seconds is not None
+            else None
+        )
+        deadline = Deadline(expires_at, self.checkpoint)
+        if deadline.expired():
+            raise Overloaded("The request waited too long to be handled.")
+        with self.lock:
+            limit = self.concurrency_limits.get(route)
+            in_progress = self.in_progress.get(route, 0)
+            if limit is not None and in_progress >= limit:
+                raise Overloaded(f"Too many requests to {route} are in progress.")
+            if self.cost > 0 and self.cost + cost > self.max_cost:
+                raise Overloaded("Too many expensive requests are in progress.")
+            self.in_progress[route] = in_progress + 1
+            self.cost += cost
+        return Ticket(route, cost, deadline)
+
+    def release(self, ticket: Ticket) -> None:
+        with self.lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self.in_progress[ticket.route] -= 1
+            self.cost -= ticket.cost
+
+    def unavailable(self, message: str) -> Response:
+        return Response(
+            dumps({"error": message}),
+            503,
+            headers={"Retry-After": str(self.retry_after)},
+            content_type="application/json",
+        )
+
+
+def received_at() -> float:
+    """
+    Returns when the current request was received. The proxy sets the
+    X-Request-Start header to the time (in seconds) it received the request,
+    which includes any time spent waiting for the API to accept it.
+    """
+    header = request.headers.get("X-Request-Start", "")
+    try:
+        return float(header[2:] if header.startswith("t=") else header)
+    except ValueError:
+        return time()
+
+
+def admitted(
+    control: AdmissionControl, cost: Callable[..., int] = lambda *args, **kwargs: 1
+) -> Callable[[Callable[..., Response]], Callable[..., Response]]:
+    """
+    Returns a decorator for routes that are subject to admission control. The
+    cost function is called with the route's arguments, and should be cheap.
+
+    It should be applied beneath `app.cache.conditional`, so that requests
+    that are served from the cache bypass it.
+    """
+
+    def decorator(route: Callable[..., Response]) -> Callable[..., Response]:
+        @wraps(route)
+        def wrapper(*args, **kwargs) -> Response:
+            try:
+                ticket = control.admit(
+                    route.__name__, cost(*args, **kwargs), received_at()
+                )
+            except Overloaded as err:
+                return control.unavailable(str(err))
+            g.deadline = ticket.deadline
+            streamed = False
+            try:
+                # Other requests get a chance to be admitted before this one
+                # is handled, as some routes don't check their deadline.
+                ticket.deadline.check()
+                resp = route(*args, **kwargs)
+                # Streamed responses are still being produced when we return,
+                # so they hold on to their capacity until they're done.
+                if resp.is_streamed:
+                    resp.call_on_close(lambda: control.release(ticket))
+                    streamed = True
+                return resp
+            except DeadlineExceeded:
+                return control.unavailable("The request took too long to handle.")
+            finally:
+                if not streamed:
+                    control.release(ticket)
+
+        return wrapper
+
+    return decorator
@@ -1,30 +1,129 @@
 from flask import Flask, Blueprint, request, current_app, Response
 from random import randint
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 from json import dumps
 from time import sleep
-from app.data import InteractionIndex, InteractionId
+from app.data import InteractionIndex, InteractionId, Agent, EvidenceFilter
+from app.data import CLINICAL_STUDY, HUMAN_STUDY, ANIMAL_STUDY, RETRACTION
+from app.data import INTERACTION_SORTS
+from app.serialize import Encoder
+from app.export import export_ndjson, ENT_TYPES
+from app.cache import conditional, app_revision, ResponseCache
+from app.cache import DEFAULT_CACHE_CONTROL
+from app.admission import AdmissionControl, admitted, current_deadline
+from app.admission import DEFAULT_CONCURRENCY_LIMITS, DEFAULT_MAX_COST
+from app.admission import DEFAULT_DEADLINE_SECONDS
 from logging import getLogger
-import simplejson
 import os
 
 
-def create_api(idx: InteractionIndex) -> Blueprint:
+def create_api(
+    idx: InteractionIndex,
+    cache_control: Optional[Dict[str, str]] = None,
+    response_cache_bytes: int = 128 * 1024 * 1024,
+    admission: Optional[AdmissionControl] = None,
+    cache_bypass_token: Optional[str] = None,
+) -> Blueprint:
     """
     Creates an instance of your API. If you'd like to toggle behavior based on
     command line flags or other inputs, add them as arguments to this function.
+
+    The cache_control argument maps the name of each route's function to the
+    Cache-Control header it's sent with. The values are merged with the
+    defaults in `app.cache.DEFAULT_CACHE_CONTROL`.
+
+    The response_cache_bytes argument limits the size of the encoded (and
+    compressed) response bodies that are kept in memory. Requests that are
+    sent with the cache_bypass_token bypass that cache, see
+    `app.cache.conditional`.
+
+    The admission argument limits the expensive requests that are handled at
+    once, see `app.admission.AdmissionControl`. Requests that are served from
+    the cache aren't subject to it.
     """
     api = Blueprint("api", __name__)
 
     logger = getLogger(__name__)
 
+    # Every response is immutable for a given version of the data (and of
+    # the code), which allows clients (and the proxy) to cache them, and
+    # allows us to encode and compress each one once.
+    cached = conditional(
+        idx.version,
+        app_revision(),
+        {**DEFAULT_CACHE_CONTROL, **(cache_control or {})},
+        ResponseCache(response_cache_bytes),
+        cache_bypass_token,
+    )
+
+    if admission is None:
+        admission = AdmissionControl(
+            DEFAULT_CONCURRENCY_LIMITS, DEFAULT_MAX_COST, DEFAULT_DEADLINE_SECONDS
+        )
+
+    def agent_cost(cui: str) -> int:
+        return idx.get_agent_cost(cui)
+
+    def interaction_cost(iid: str) -> int:
+        try:
+            return idx.get_interaction_cost(InteractionId.from_str(iid))
+        except RuntimeError:
+            return 1
+
+    def paper_cost(pid: str) -> int:
+        return 1 + len(idx.sentence_refs_by_paper_id.get(pid, []))
+
+    def export_cost() -> int:
+        try:
+            return 1 + int(request.args.get("limit", default=100))
+        except ValueError:
+            return 1
+
+    # Agents are included in almost every response, so we only encode each
+    # one once.
+    encoder = Encoder(memoized=[Agent])
+
     def error(message: str, status: int = 400) -> Response:
         return Response(
-            simplejson.dumps({"error": message}),
+            encoder.dumps({"error": message}),
             status,
             content_type="application/json",
         )
 
+    def evidence_filter() -> EvidenceFilter:
+        """
+        Returns the filter for evidence described by the query parameters of
+        the current request. Each flag parameter can be set to "true", to
+        only include papers with that flag, or "false", to exclude them.
+        Raises a ValueError if a parameter has an invalid value.
+        """
+        required = 0
+        excluded = 0
+        for name, flag in [
+            ("clinical_study", CLINICAL_STUDY),
+            ("human_study", HUMAN_STUDY),
+            ("animal_study", ANIMAL_STUDY),
+            ("retraction", RETRACTION),
+        ]:
+            value = request.args.get(name, default=None)
+            if value is None:
+                continue
+            if value.lower() == "true":
+                required |= flag
+            elif value.lower() == "false":
+                excluded |= flag
+            else:
+                raise ValueError(f"Invalid value for '{name}'.")
+        years = []
+        for name in ["year_min", "year_max"]:
+            try:
+                year = request.args.get(name, default=None)
+                years.append(int(year) if year is not None else None)
+            except ValueError:
+                raise ValueError(f"Invalid value for '{name}'.")
+        [min_year, max_year] = years
+        return EvidenceFilter(required, excluded, min_year, max_year)
+
     # This route simply tells anything that depends on the API that it's
     # working. If you'd like to redefine this behavior that's ok, just
     # make sure a 200 is returned.
@@ -33,10 +132,16 @@ def create_api(idx: InteractionIndex) -> Blueprint:
         return Response("", 204)
 
     @api.route("/interaction/<string:iid>", methods=["GET"])
+    @cached
+    @admitted(admission, interaction_cost)
     def get_interaction(iid: str) -> Response:
         interaction_id = InteractionId.from_str(iid)
         first_agent_id, second_agent_id = interaction_id.cuis
-        response = simplejson.dumps(
+        try:
+            filters = evidence_filter()
+        except ValueError as err:
+            return error(str(err), 400)
+        response = encoder.dumps(
             {
                 "interaction_id": str(interaction_id),
                 "slug": idx.get_interaction_id_slug(interaction_id),
@@ -44,19 +149,22 @@ def create_api(idx: InteractionIndex) -> Blueprint:
                     idx.get_agent(first_agent_id),
                     idx.get_agent(second_agent_id),
                 ],
-                "evidence": idx.get_evidence(interaction_id),
+                "evidence": idx.get_evidence(interaction_id, filters),
             }
         )
         return Response(response, 200, content_type="application/json")
 
     @api.route("/agent/<string:cui>", methods=["GET"])
+    @cached
     def get_agent_by_cui(cui: str) -> Response:
         agent = idx.get_agent_with_interaction_count(cui)
         if agent is None:
             return error("Not Found", 404)
-        return Response(simplejson.dumps(agent), 200, content_type="application/json")
+        return Response(encoder.dumps(agent), 200, content_type="application/json")
 
     @api.route("/agent/<string:cui>/interactions", methods=["GET"])
+    @cached
+    @admitted(admission, agent_cost)
     def get_agent_interactions(cui: str) -> Response:
         agent = idx.get_agent(cui)
         if agent is None:
@@ -67,7 +175,19 @@ def create_api(idx: InteractionIndex) -> Blueprint:
             page = int(request.args.get("p", default=1)) - 1
         except ValueError:
             return error("Invalid value for 'p'.", 400)
-        all_interactions = idx.get_interactions(agent)
+        try:
+            filters = evidence_filter()
+        except ValueError as err:
+            return error(str(err), 400)
+        sort = request.args.get("sort", default="evidence")
+        if sort not in INTERACTION_SORTS:
+            return error(
+                f"Invalid value for 'sort', expected one of: {', '.join(INTERACTION_SORTS)}.",
+                400,
+            )
+        # We only retrieve the evidence for the interactions on the requested
+        # page, as that's by far the most expensive part.
+        all_interactions = idx.get_interaction_refs(agent, filters, sort)
         q = request.args.get("q", default="").lower().strip()
         if q != "":
             matches = []
@@ -80,9 +200,15 @@ def create_api(idx: InteractionIndex) -> Blueprint:
         interactions_per_page = 50
         start = page * interactions_per_page
         end = start + interactions_per_page
-        interactions_page = interactions[start : min(len(interactions), end)]
+        # Retrieving the evidence for a page of interactions can take a
+        # while for agents with a lot of it, so we stop if we run out of time.
+        deadline = current_deadline()
+        interactions_page = []
+        for ref in interactions[start : min(len(interactions), end)]:
+            deadline.check()
+            interactions_page.append(idx.get_interacting_agent(ref, filters))
         return Response(
-            simplejson.dumps(
+            encoder.dumps(
                 {
                     "page": page + 1,
                     "interactions": interactions_page,
@@ -94,6 +220,148 @@ def create_api(idx: InteractionIndex) -> Blueprint:
             content_type="application/json",
         )
 
+    @api.route("/agent/<string:cui>/neighbors", methods=["GET"])
+    @cached
+    def get_agent_neighbors(cui: str) -> Response:
+        agent = idx.get_agent(cui)
+        if agent is None:
+            return error("Not Found", 404)
+        try:
+            n = int(request.args.get("n", default=10))
+        except ValueError:
+            return error("Invalid value for 'n'.", 400)
+        if n < 1 or n > 100:
+            return error("The value for 'n' must be between 1 and 100.", 400)
+        return Response(
+            encoder.dumps(
+                {"agent": agent, "neighbors": idx.get_top_neighbors(agent, n)}
+            ),
+            200,
+            content_type="application/json",
+        )
+
+    @api.route("/agent/<string:cui>/neighbors/two-hop", methods=["GET"])
+    @cached
+    @admitted(admission, agent_cost)
+    def get_agent_two_hop_neighbors(cui: str) -> Response:
+        agent = idx.get_agent(cui)
+        if agent is None:
+            return error("Not Found", 404)
+        try:
+            page = int(request.args.get("p", default=1)) - 1
+        except ValueError:
+            return error("Invalid value for 'p'.", 400)
+        neighbors = idx.get_two_hop_neighbors(agent)
+        neighbors_per_page = 50
+        start = page * neighbors_per_page
+        end = start + neighbors_per_page
+        return Response(
+            encoder.dumps(
+                {
+                    "agent": agent,
+                    "page": page + 1,
+                    "neighbors": neighbors[start : min(len(neighbors), end)],
+                    "neighbors_per_page": neighbors_per_page,
+                    "total": len(neighbors),
+                }
+            ),
+            200,
+            content_type="application/json",
+        )
+
+    @api.route("/agent/shared", methods=["GET"])
+    @cached
+    @admitted(admission)
+    def get_shared_neighbors() -> Response:
+        cuis = request.args.getlist("cui")
+        if len(cuis) < 2 or len(cuis) > 5:
+            return error("Between 2 and 5 values for 'cui' are required.", 400)
+        agents = []
+        for cui in cuis:
+            agent = idx.get_agent(cui)
+            if agent is None:
+                return error("Not Found", 404)
+            agents.append(agent)
+        try:
+            page = int(request.args.get("p", default=1)) - 1
+        except ValueError:
+            return error("Invalid value for 'p'.", 400)
+        neighbors = idx.get_shared_neighbors(agents)
+        neighbors_per_page = 50
+        start = page * neighbors_per_page
+        end = start + neighbors_per_page
+        return Response(
+            encoder.dumps(
+                {
+                    "agents": agents,
+                    "page": page + 1,
+                    "neighbors": neighbors[start : min(len(neighbors), end)],
+                    "neighbors_per_page": neighbors_per_page,
+                    "total": len(neighbors),
+                }
+            ),
+            200,
+            content_type="application/json",
+        )
+
+    @api.route("/paper/<string:pid>", methods=["GET"])
+    @cached
+    @admitted(admission, paper_cost)
+    def get_paper(pid: str) -> Response:
+        if not idx.has_paper(pid):
+            return error("Not Found", 404)
+        try:
+            page = int(request.args.get("p", default=1)) - 1
+        except ValueError:
+            return error("Invalid value for 'p'.", 400)
+        interactions = idx.get_paper_interactions(pid)
+        interactions_per_page = 50
+        start = page * interactions_per_page
+        end = start + interactions_per_page
+        return Response(
+            encoder.dumps(
+                {
+                    "paper": idx.get_paper(pid),
+                    "page": page + 1,
+                    "interactions": interactions[start : min(len(interactions), end)],
+                    "interactions_per_page": interactions_per_page,
+                    "total": len(interactions),
+                }
+            ),
+            200,
+            content_type="application/json",
+        )
+
+    # The export is streamed, as it's too large to hold in memory, so it
+    # isn't cached.
+    @api.route("/export", methods=["GET"])
+    @admitted(admission, export_cost)
+    def export() -> Response:
+        cursor = request.args.get("cursor", default=None)
+        ent_type = request.args.get("ent_type", default=None)
+        if ent_type is not None and ent_type not in ENT_TYPES:
+            return error(
+                f"Invalid value for 'ent_type', expected one of: {', '.join(ENT_TYPES)}.",
+                400,
+            )
+        try:
+            limit = int(request.args.get("limit", default=100))
+        except ValueError:
+            return error("Invalid value for 'limit'.", 400)
+        if limit < 1 or limit > 1000:
+            return error("The value for 'limit' must be between 1 and 1000.", 400)
+        # The page is produced after we return, so it checks the deadline
+        # itself, and ends early if it runs out of time.
+        deadline = current_deadline()
+        return Response(
+            export_ndjson(idx, cursor, ent_type, limit, encoder, deadline),
+            200,
+            content_type="application/x-ndjson",
+        )
+
+    # The search routes aren't cached, as their results come from Algolia
+    # rather than the index. Algolia is populated in the background (see
+    # `app.search`), so until that's done the results are incomplete.
     @api.route("/agent/suggest", methods=["GET"])
     def suggest_agents() -> Response:
         query = request.args.get("q", default=None)
@@ -128,7 +396,7 @@ def create_api(idx: InteractionIndex) -> Blueprint:
             + results_with_interactions
             + results_without_interactions
         )
-        response = simplejson.dumps(
+        response = encoder.dumps(
             {"query": {"q": search_results.query}, "results": sorted_results}
         )
         return Response(response, 200, content_type="application/json")
@@ -143,7 +411,7 @@ def create_api(idx: InteractionIndex) -> Blueprint:
         if query is None:
             return error("The q argument is required")
         search_results = idx.search_for_agents(query, page=page)
-        response = simplejson.dumps(
+        response = encoder.dumps(
             {
                 "query": {"q": search_results.query, "p": search_results.page},
                 "results": search_results.results,
@@ -155,9 +423,10 @@ def create_api(idx: InteractionIndex) -> Blueprint:
         return Response(response, 200, content_type="application/json")
 
     @api.route("/meta", methods=["GET"])
+    @cached
     def meta() -> Response:
         return Response(
-            simplejson.dumps(
+            encoder.dumps(
                 {
                     "version": idx.version,
                     "interaction_count": idx.interaction_count,
@@ -0,0 +1,233 @@
+from flask import Response, request
+from functools import wraps
+from typing import Callable, Dict, Optional
+from collections import OrderedDict
+from threading import Lock
+from hashlib import sha1
+from hmac import compare_digest
+from os import path
+import os
+import zlib
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+# The header that requests which bypass the response cache are sent with, see
+# `conditional()`.
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+# The Cache-Control header sent with successful responses from each route,
+# keyed by the name of the function that handles the route. Routes that
+# aren't listed here don't get a Cache-Control header.
+DEFAULT_CACHE_CONTROL: Dict[str, str] = {
+    "get_interaction": "public, max-age=3600",
+    "get_agent_by_cui": "public, max-age=3600",
+    "get_agent_interactions": "public, max-age=3600",
+    "get_agent_neighbors": "public, max-age=3600",
+    "get_agent_two_hop_neighbors": "public, max-age=3600",
+    "get_shared_neighbors": "public, max-age=3600",
+    "get_paper": "public, max-age=3600",
+    "meta": "public, max-age=60",
+}
+
+# Bodies smaller than this aren't compressed, as the savings don't make up for
+# the overhead.
+MIN_COMPRESSED_SIZE = 1024
+
+
+def gzip(body: bytes) -> bytes:
+    # We use zlib directly, rather than the gzip module, so that the output
+    # doesn't include a timestamp and is the same for the same input.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+def supported_encodings() -> Dict[str, Callable[[bytes], bytes]]:
+    """
+    Returns the content encodings we can produce, in order of preference.
+    """
+    encodings: Dict[str, Callable[[bytes], bytes]] = OrderedDict()
+    if brotli is not None:
+        encodings["br"] = lambda body: brotli.compress(body, quality=5)
+    encodings["gzip"] = gzip
+    return encodings
+
+
+class CachedBody:
+    """
+    An encoded response body and the compressed variants of it that have been
+    requested so far.
+    """
+
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.variants: Dict[str, bytes] = {}
+
+    def size(self) -> int:
+        return len(self.body) + sum(map(len, self.variants.values()))
+
+
+class ResponseCache:
+    """
+    A LRU cache of encoded response bodies, bounded by the total number of
+    bytes held. Each body is compressed at most once per encoding, and the
+    compressed variants are stored alongside it.
+
+    The cache is intended to be used for a single version of the data, so
+    entries never need to be invalidated.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[str, CachedBody]" = OrderedDict()
+        self.lock = Lock()
+        self.encodings = supported_encodings()
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedBody) -> None:
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size()
+            self.entries[key] = entry
+            self.size += entry.size()
+            self.evict()
+
+    def encode(self, key: str, entry: CachedBody, encoding: str) -> bytes:
+        """
+        Returns the body of the entry in the requested encoding, compressing
+        it (and storing the result) if that hasn't been done before.
+        """
+        if encoding in entry.variants:
+            return entry.variants[encoding]
+        compressed = self.encodings[encoding](entry.body)
+        with self.lock:
+            if encoding not in entry.variants:
+                entry.variants[encoding] = compressed
+                if self.entries.get(key) is entry:
+                    self.size += len(compressed)
+                    self.evict()
+        return compressed
+
+    def evict(self) -> None:
+        while self.size > self.max_bytes and len(self.entries) > 0:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size()
+
+    def negotiate(self, entry: CachedBody) -> str:
+        """
+        Returns the encoding that should be used to send the entry to the
+        client that made the current request.
+        """
+        if len(entry.body) < MIN_COMPRESSED_SIZE:
+            return "identity"
+        for encoding in self.encodings:
+            if request.accept_encodings[encoding] > 0:
+                return encoding
+        return "identity"
+
+
+def app_revision() -> str:
+    """
+    Returns an identifier for the API's code. The SUPP_AI_REVISION environment
+    variable is used if it's set, which is the git SHA when deployed.
+    Otherwise it's derived from the API's source.
+    """
+    revision = os.environ.get("SUPP_AI_REVISION", "").strip()
+    if revision != "":
+        return revision[:12]
+    digest = sha1()
+    app_dir = path.dirname(path.abspath(__file__))
+    for name in sorted(os.listdir(app_dir)):
+        if name.endswith(".py"):
+            with open(path.join(app_dir, name), "rb") as fp:
+                digest.update(fp.read())
+    return digest.hexdigest()[:12]
+
+
+def conditional(
+    version: str,
+    revision: str,
+    cache_control: Dict[str, str],
+    responses: ResponseCache,
+    bypass_token: Optional[str] = None,
+) -> Callable[[Callable[..., Response]], Callable[..., Response]]:
+    """
+    Returns a decorator for routes whose responses don't change for a given
+    data version and revision of the code, see `app_revision()`. Successful
+    responses are sent with an ETag derived from both and the route's
+    Cache-Control header.
+
+    Successful responses are also stored in the provided cache, and sent
+    compressed to clients that accept it. If a bypass token is provided,
+    requests with an X-Cache-Bypass header that matches it are computed
+    again, and the result isn't stored. That's how `sonar` measures the cost
+    of a route. Anyone else gets the cached response, as otherwise any
+    client could make us compute the most expensive responses over and over.
+
+    Requests with a matching If-None-Match header get a 304, without the
+    route being invoked, which means the response body is never computed.
+    The ETag is only sent with successful responses, so a client can only
+    have a matching one for a URL that succeeded for the same version of the
+    data and of the code.
+    """
+    tag = f"{version}-{revision}"
+    etags = [tag] + [f"{tag}-{encoding}" for encoding in responses.encodings]
+
+    def decorator(route: Callable[..., Response]) -> Callable[..., Response]:
+        headers = {"Vary": "Accept-Encoding"}
+        if route.__name__ in cache_control:
+            headers["Cache-Control"] = cache_control[route.__name__]
+
+        @wraps(route)
+        def wrapper(*args, **kwargs) -> Response:
+            for etag in etags:
+                if request.if_none_match.contains_weak(etag):
+                    return Response(
+                        status=304, headers={**headers, "ETag": f'"{etag}"'}
+                    )
+
+            key = request.full_path
+            bypass = bypass_token is not None and compare_digest(
+                request.headers.get(CACHE_BYPASS_HEADER, ""), bypass_token
+            )
+            entry = None if bypass else responses.get(key)
+            if entry is None:
+                resp = route(*args, **kwargs)
+                if resp.status_code != 200:
+                    return resp
+                entry = CachedBody(resp.get_data(), resp.headers["Content-Type"])
+                if not bypass:
+                    responses.put(key, entry)
+
+            encoding = responses.negotiate(entry)
+            if encoding == "identity":
+                return Response(
+                    entry.body,
+                    200,
+                    headers={**headers, "ETag": f'"{tag}"'},
+                    content_type=entry.content_type,
+                )
+            return Response(
+                responses.encode(key, entry, encoding),
+                200,
+                headers={
+                    **headers,
+                    "ETag": f'"{tag}-{encoding}"',
+                    "Content-Encoding": encoding,
+                },
+                content_type=entry.content_type,
+            )
+
+        return wrapper
+
+    return decorator
@@ -1,14 +1,32 @@
-from typing import Iterable, List, Dict, Optional, Tuple, Union, NamedTuple
+from typing import Iterable, List, Dict, Optional, Tuple, Union, NamedTuple, Callable
+from typing import Iterator
+from bisect import bisect_right
+from itertools import islice
 from json import load
 from os import path, environ
+from sys import intern
 from logging import getLogger
 from algoliasearch.search_client import SearchClient  # type:ignore
 from re import sub, split, fullmatch, sub
 from urllib.parse import quote_plus
 from math import floor
+from app.progress import LoadProgress
+from app.graph import InteractionGraph
 
 logger = getLogger(__name__)
 
+ALGOLIA_APP_ID = "PEUZR5B1FW"
+
+# The phases of work done by `InteractionIndex.from_data`, in order.
+LOAD_PHASES = [
+    "agents",
+    "sentences",
+    "interaction_ids",
+    "papers",
+    "index_meta",
+    "index",
+]
+
 
 def slug(text: str) -> str:
     """
@@ -17,6 +35,14 @@ def slug(text: str) -> str:
     return quote_plus(sub(r"[\W_]", "-", text.lower()))
 
 
+def search_index_name(version: str) -> str:
+    """
+    Returns the name of the Algolia index that holds the agents for the
+    provided data version.
+    """
+    return environ.get("SUPP_AI_INDEX_NAME", f"agent_{version}")
+
+
 class Agent(NamedTuple):
     """
     Model for a supplement or drug, or rather an individual agent that's
@@ -37,6 +63,12 @@ class Agent(NamedTuple):
     ent_type: str
     slug: str
 
+    @staticmethod
+    def from_json(cui: str, fields: Dict) -> "Agent":
+        return Agent(
+            **{**{"cui": cui, "slug": slug(fields["preferred_name"])}, **fields}
+        )
+
 
 class AgentWithInteractionCount(NamedTuple):
     """
@@ -122,6 +154,221 @@ class Paper(NamedTuple):
         return Paper(**with_authors)
 
 
+# The orders an agent's interactions can be retrieved in. By default they're
+# ordered by the amount of evidence.
+INTERACTION_SORTS = ["evidence", "recent", "clinical", "name"]
+
+# Bits that describe a paper, see `paper_flags()`.
+CLINICAL_STUDY = 1 << 0
+HUMAN_STUDY = 1 << 1
+ANIMAL_STUDY = 1 << 2
+RETRACTION = 1 << 3
+
+
+def paper_flags(paper: Paper) -> int:
+    """
+    Returns a bitset describing the kind of study the paper is, and whether
+    it was retracted.
+    """
+    flags = 0
+    if paper.clinical_study:
+        flags |= CLINICAL_STUDY
+    if paper.human_study:
+        flags |= HUMAN_STUDY
+    if paper.animal_study:
+        flags |= ANIMAL_STUDY
+    if paper.retraction:
+        flags |= RETRACTION
+    return flags
+
+
+class EvidenceFilter(NamedTuple):
+    """
+    Model for criteria that papers must meet to be included as evidence. A
+    paper must have all of the `required` flags, none of the `excluded` ones
+    and, if either year is set, been published within that range.
+    """
+
+    required: int = 0
+    excluded: int = 0
+    min_year: Optional[int] = None
+    max_year: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return (
+            self.required == 0
+            and self.excluded == 0
+            and self.min_year is None
+            and self.max_year is None
+        )
+
+    def has_years(self) -> bool:
+        return self.min_year is not None or self.max_year is not None
+
+    def matches_flags(self, flags: int) -> bool:
+        return flags & self.required == self.required and flags & self.excluded == 0
+
+    def matches(self, flags: int, year: Optional[int]) -> bool:
+        if not self.matches_flags(flags):
+            return False
+        if not self.has_years():
+            return True
+        if year is None:
+            return False
+        if self.min_year is not None and year < self.min_year:
+            return False
+        if self.max_year is not None and year > self.max_year:
+            return False
+        return True
+
+
+# The maximum number of words of a sentence that we display, see
+# `build_spans()`.
+MAX_WORDS = 49
+
+
+class SentenceText(NamedTuple):
+    """
+    The text of a sentence from a paper, and the number of words in it.
+    """
+
+    paper_id: str
+    sentence_id: int
+    text: str
+    word_count: int
+
+    @staticmethod
+    def from_json(fields: Dict) -> "SentenceText":
+        sentence: str = fields["sentence"]
+        all_words = list(
+            filter(lambda token: len(token.strip()) > 0, split(r"\W+", sentence))
+        )
+        return SentenceText(
+            fields["paper_id"], fields["sentence_id"], sentence, len(all_words)
+        )
+
+
+def build_spans(
+    sentence: SentenceText, first: SupportingSentenceArg, second: SupportingSentenceArg
+) -> List[SupportingSentenceSpan]:
+    # We convert each sentence into a list of spans, where each span
+    # is the text from that portion of the sentence and an optional cui.
+    # If a cui is set, it means the span constitutes a mention of an
+    # agent in the sentence. So, for instance, if we had the sentence
+    # "I drink water, after eating donuts" and our agents were "water",
+    # and "donuts", we'd produce the spans:
+    # [
+    #   { text: "I drink ", cui: None },
+    #   { text: "water", cui: "C123456" },
+    #   { text: ", after eating ", cui: None },
+    #   { text: "donuts", cui: "C654321" }
+    # ]
+
+    # Put together our sentence spans
+    text = sentence.text
+    [first_start, first_end] = first.span
+    [second_start, second_end] = second.span
+    spans = [
+        SupportingSentenceSpan(
+            text[0 : first_start - 1 if first_start > 0 else 0], None
+        ),
+        SupportingSentenceSpan(text[first_start:first_end], first.cui),
+        SupportingSentenceSpan(text[first_end:second_start], None),
+        SupportingSentenceSpan(text[second_start:second_end], second.cui),
+        SupportingSentenceSpan(text[second_end:], None),
+    ]
+
+    # Some of the publishers S2 works with only allow us to display up to
+    # 49 words. Rather than try to figure out if a paper is subject to
+    # those restrictions, we just make sure we never display > 49 words.
+    if sentence.word_count > MAX_WORDS:
+        diff = sentence.word_count - MAX_WORDS
+        span_idx = 0
+        span_count = len(spans)
+        while diff > 0:
+            span = spans[span_idx]
+            # Don't remove entity mentions, as they're important to
+            # maintain in the UI
+            if span.cui is None:
+                # Split the text on
+                tokens = split(r"(\W+)", span.text)
+                token_count = len(tokens)
+                # Prefer tokens in the middle of a span, as these are
+                # further from the mentioned entity and are accordingly
+                # less likely to be important.
+                mid = floor(token_count / 2)
+                for idx in [*range(mid, token_count), *range(0, mid)]:
+                    token = tokens[idx]
+                    # We'll replace the first word we find.
+                    if fullmatch(r"\w+", token):
+                        tokens[idx] = "…"
+                        diff -= 1
+                        # Put together the text, and remove ellipsis that
+                        # occur one after another.
+                        truncated = sub(r"…\W+…", "…", "".join(tokens))
+                        spans[span_idx] = SupportingSentenceSpan(truncated, None)
+                        break
+            span_idx += 1
+            # Start over if we iterate over all spans and still need to
+            # remove words.
+            if span_idx == span_count:
+                span_idx = 0
+
+    # If there's a span with *only* punctuation before or after a mentioned
+    # entity collapse it with the bordering entity. Not doing so causes
+    # weird wrapping issues in the UI.
+    [prefix, first_entity, between, second_entity, tail] = spans
+    if prefix.text != "…" and fullmatch(r"\W+", prefix.text):
+        first_entity = SupportingSentenceSpan(
+            f"{prefix.text}{first_entity.text}", first_entity.cui
+        )
+        prefix = None  # type:ignore
+    if between.text != "…" and fullmatch(r"\W+", between.text):
+        first_entity = SupportingSentenceSpan(
+            f"{first_entity.text}{between.text}", first_entity.cui
+        )
+        between = None  # type:ignore
+    if tail.text != "…" and fullmatch(r"\W+", tail.text):
+        second_entity = SupportingSentenceSpan(
+            f"{second_entity.text}{tail.text}", second_entity.cui
+        )
+        tail = None  # type:ignore
+    # The same text often appears in the spans of several sentences, like
+    # the portion of a sentence before the first mention, which is the same
+    # for each pair of agents it mentions. Interning it means it's only
+    # stored once.
+    return [
+        SupportingSentenceSpan(intern(span.text), span.cui)
+        for span in [prefix, first_entity, between, second_entity, tail]
+        if span is not None
+    ]
+
+
+class SentenceCache:
+    """
+    Shares the work done to read sentences while they're loaded. The same
+    sentence is often evidence of several interactions, as it can mention
+    more than two agents, so each sentence's words are counted once, keyed
+    by (paper_id, sentence_id).
+
+    The spans are different for each pair of mentions, so they're built for
+    each one. The text they have in common is shared by `build_spans()`,
+    which interns it.
+    """
+
+    def __init__(self):
+        self.texts: Dict[Tuple[str, int], SentenceText] = {}
+
+    def get_text(self, fields: Dict) -> SentenceText:
+        key = (fields["paper_id"], fields["sentence_id"])
+        text = self.texts.get(key)
+        if text is None or text.text != fields["sentence"]:
+            text = SentenceText.from_json(fields)
+            if key not in self.texts:
+                self.texts[key] = text
+        return text
+
+
 class SupportingSentence(NamedTuple):
     """
     Model for a sentence, from a paper, where two agents that interact with
@@ -136,19 +383,18 @@ class SupportingSentence(NamedTuple):
     spans: List[SupportingSentenceSpan]
 
     @staticmethod
-    def from_json(fields: Dict) -> "SupportingSentence":
-        # We convert each sentence into a list of spans, where each span
-        # is the text from that portion of the sentence and an optional cui.
-        # If a cui is set, it means the span constitutes a mention of an
-        # agent in the sentence. So, for instance, if we had the sentence
-        # "I drink water, after eating donuts" and our agents were "water",
-        # and "donuts", we'd produce the spans:
-        # [
-        #   { text: "I drink ", cui: None },
-        #   { text: "water", cui: "C123456" },
-        #   { text: ", after eating ", cui: None },
-        #   { text: "donuts", cui: "C654321" }
-        # ]
+    def from_json(
+        fields: Dict, cache: Optional[SentenceCache] = None
+    ) -> "SupportingSentence":
+        """
+        Returns the sentence described by the provided fields. If a cache is
+        provided, the work done to read its text is shared with the other
+        sentences that are loaded with it.
+        """
+        if cache is None:
+            cache = SentenceCache()
+        text = cache.get_text(fields)
+
         arg1 = SupportingSentenceArg.from_json(fields["arg1"])
         arg2 = SupportingSentenceArg.from_json(fields["arg2"])
 
@@ -158,95 +404,13 @@ class SupportingSentence(NamedTuple):
         args_ordered_by_index.sort(key=lambda arg: arg.span[0])
         [first, second] = args_ordered_by_index
 
-        # Put together our sentence spans
-        sentence: str = fields["sentence"]
-        spans = [
-            SupportingSentenceSpan(
-                sentence[0 : first.span[0] - 1 if first.span[0] > 0 else 0], None
-            ),
-            SupportingSentenceSpan(sentence[first.span[0] : first.span[1]], first.cui),
-            SupportingSentenceSpan(sentence[first.span[1] : second.span[0]], None),
-            SupportingSentenceSpan(
-                sentence[second.span[0] : second.span[1]], second.cui
-            ),
-            SupportingSentenceSpan(sentence[second.span[1] :], None),
-        ]
-
-        # Some of the publishers S2 works with only allow us to display up to
-        # 49 words. Rather than try to figure out if a paper is subject to
-        # those restrictions, we just make sure we never display > 49 words.
-        all_words = list(
-            filter(lambda token: len(token.strip()) > 0, split(r"\W+", sentence))
+        return SupportingSentence(
+            fields["uid"],
+            fields["confidence"],
+            text.paper_id,
+            text.sentence_id,
+            build_spans(text, first, second),
         )
-        word_count = len(all_words)
-        if word_count > 49:
-            diff = word_count - 49
-            span_idx = 0
-            span_count = len(spans)
-            while diff > 0:
-                span = spans[span_idx]
-                # Don't remove entity mentions, as they're important to
-                # maintain in the UI
-                if span.cui is None:
-                    # Split the text on
-                    tokens = split(r"(\W+)", span.text)
-                    token_count = len(tokens)
-                    # Prefer tokens in the middle of a span, as these are
-                    # further from the mentioned entity and are accordingly
-                    # less likely to be important.
-                    mid = floor(token_count / 2)
-                    for idx in [*range(mid, token_count), *range(0, mid)]:
-                        token = tokens[idx]
-                        # We'll replace the first word we find.
-                        if fullmatch(r"\w+", token):
-                            tokens[idx] = "…"
-                            diff -= 1
-                            # Put together the text, and remove ellipsis that
-                            # occur one after another.
-                            text = sub(r"…\W+…", "…", "".join(tokens))
-                            spans[span_idx] = SupportingSentenceSpan(text, None)
-                            break
-                span_idx += 1
-                # Start over if we iterate over all spans and still need to
-                # remove words.
-                if span_idx == span_count:
-                    span_idx = 0
-
-        # If there's a span with *only* punctuation before or after a mentioned
-        # entity collapse it with the bordering entity. Not doing so causes
-        # weird wrapping issues in the UI.
-        [prefix, first_entity, between, second_entity, tail] = spans
-        if prefix.text != "…" and fullmatch(r"\W+", prefix.text):
-            first_entity = SupportingSentenceSpan(
-                f"{prefix.text}{first_entity.text}", first_entity.cui
-            )
-            prefix = None  # type:ignore
-        if between.text != "…" and fullmatch(r"\W+", between.text):
-            first_entity = SupportingSentenceSpan(
-                f"{first_entity.text}{between.text}", first_entity.cui
-            )
-            between = None  # type:ignore
-        if tail.text != "…" and fullmatch(r"\W+", tail.text):
-            second_entity = SupportingSentenceSpan(
-                f"{second_entity.text}{tail.text}", second_entity.cui
-            )
-            tail = None  # type:ignore
-        collapsed_spans = list(
-            filter(
-                lambda sp: sp != None,
-                [prefix, first_entity, between, second_entity, tail],
-            )
-        )
-
-        # Add the extra information we prepared
-        with_spans: Dict = {**fields, "spans": collapsed_spans}
-
-        # Remove fields that from the model that the UI doesn't use
-        del with_spans["sentence"]
-        del with_spans["arg1"]
-        del with_spans["arg2"]
-
-        return SupportingSentence(**with_spans)
 
 
 class Evidence(NamedTuple):
@@ -304,6 +468,53 @@ class InteractionId(NamedTuple):
         return InteractionId((first, second))
 
 
+class NeighborAgent(NamedTuple):
+    """
+    Model for an agent that's connected to another agent in the interaction
+    graph, either directly (hops is 1) or via another agent (hops is 2). For
+    direct neighbors the weight is the number of papers that are evidence of
+    the interaction. For agents two hops away it's the number of agents they
+    are connected through.
+    """
+
+    agent: Agent
+    hops: int
+    weight: int
+
+
+class SharedNeighborAgent(NamedTuple):
+    """
+    Model for an agent that interacts with each agent in a set of agents. The
+    weights are the number of papers that are evidence of each interaction,
+    in the same order as the set of agents.
+    """
+
+    agent: Agent
+    weights: List[int]
+
+
+class InteractionRef(NamedTuple):
+    """
+    Reference to an interaction, from the perspective of one of the agents
+    involved. The agent is the other one.
+    """
+
+    interaction_id: InteractionId
+    agent: Agent
+
+
+class PaperInteraction(NamedTuple):
+    """
+    Model for an interaction that a paper is evidence of, and the sentences
+    from the paper that support it.
+    """
+
+    interaction_id: str
+    slug: str
+    agents: List[Optional[Agent]]
+    sentence_uids: List[int]
+
+
 class InteractionIdWithSlug(NamedTuple):
     interaction_id: InteractionId
     slug: str
@@ -361,54 +572,101 @@ class InteractionIndex:
         self.cuis_by_name = InteractionIndex.build_agent_index(
             self.agents_by_cui.values()
         )
+        # The index is populated by `app.search.AgentIndexSync`, which runs
+        # separately so that the API doesn't wait on it when starting.
         self.algolia_client = SearchClient.create(
-            "PEUZR5B1FW", environ["SUPP_AI_ALGOLIA_API_KEY"]
+            ALGOLIA_APP_ID, environ["SUPP_AI_ALGOLIA_API_KEY"]
         )
-        self.index = self.init_algolia_index()
+        self.index_name = search_index_name(self.version)
+        self.index = self.algolia_client.init_index(self.index_name)
         self.index_meta = index_meta
         self.paper_metadata_by_id = paper_metadata_by_id
-
-    def init_algolia_index(self):
-        resp = self.algolia_client.list_indices()
-        indices = set(map(lambda item: item["name"], resp["items"]))
-
-        index_name = environ.get("SUPP_AI_INDEX_NAME", f"agent_{self.version}")
-        idx = self.algolia_client.init_index(index_name)
-
-        # We define the list of searchable fields everytime the application
-        # starts up. There's no indication that this is expensive to do.
-        idx.set_settings(
-            {
-                "searchableAttributes": [
-                    "preferred_name",
-                    "definition",
-                    "synonyms",
-                    "tradenames",
-                ]
+        self.paper_flags_by_id = {
+            pid: paper_flags(paper) for pid, paper in paper_metadata_by_id.items()
+        }
+
+        # For each interaction we precompute the papers that are evidence of
+        # it, and the number of them with each combination of flags. That
+        # way we can count (and filter) evidence without touching sentences.
+        #
+        # We also build a reverse index from each paper to the interactions
+        # (and sentences) it's evidence of, which includes papers without
+        # metadata.
+        self.paper_ids_by_interaction_id: Dict[InteractionId, List[str]] = {}
+        self.flag_counts_by_interaction_id: Dict[InteractionId, Dict[int, int]] = {}
+        self.sentence_refs_by_paper_id: Dict[str, List[Tuple[InteractionId, int]]] = {}
+        for interaction_id, sentences in self.sentences_by_interaction_id.items():
+            paper_ids: List[str] = []
+            seen = set()
+            flag_counts: Dict[int, int] = {}
+            for sentence in sentences:
+                if sentence.paper_id not in self.sentence_refs_by_paper_id:
+                    self.sentence_refs_by_paper_id[sentence.paper_id] = []
+                self.sentence_refs_by_paper_id[sentence.paper_id].append(
+                    (interaction_id, sentence.uid)
+                )
+                flags = self.paper_flags_by_id.get(sentence.paper_id)
+                if flags is None or sentence.paper_id in seen:
+                    continue
+                seen.add(sentence.paper_id)
+                paper_ids.append(sentence.paper_id)
+                flag_counts[flags] = flag_counts.get(flags, 0) + 1
+            self.paper_ids_by_interaction_id[interaction_id] = paper_ids
+            self.flag_counts_by_interaction_id[interaction_id] = flag_counts
+
+        self.latest_year_by_interaction_id: Dict[InteractionId, int] = {}
+        for interaction_id, paper_ids in self.paper_ids_by_interaction_id.items():
+            years = [
+                year
+                for year in (
+                    self.paper_metadata_by_id[paper_id].year for paper_id in paper_ids
+                )
+                if year is not None
+            ]
+            if len(years) > 0:
+                self.latest_year_by_interaction_id[interaction_id] = max(years)
+
+        # Each agent's interactions are sorted in each of the supported
+        # orders up front, so that retrieving a page is just a slice.
+        #
+        # We also count the sentences that are evidence of each agent's
+        # interactions, which is used to estimate the cost of a request.
+        self.interaction_refs_by_cui: Dict[str, Dict[str, List[InteractionRef]]] = {}
+        self.sentence_count_by_cui: Dict[str, int] = {}
+        sort_keys = self.interaction_sort_keys()
+        for raw_cui, interaction_ids in self.interaction_ids_by_cui.items():
+            cui = raw_cui.upper()
+            refs = self.build_interaction_refs(cui, interaction_ids)
+            self.interaction_refs_by_cui[cui] = {
+                sort: sorted(refs, key=sort_keys[sort]) for sort in INTERACTION_SORTS
             }
-        )
+            self.sentence_count_by_cui[cui] = sum(
+                len(self.sentences_by_interaction_id.get(interaction_id, []))
+                for interaction_id in interaction_ids
+            )
 
-        # Only load data into the index if the index doesn't exist. This acts
-        # as a simple gate that prevents us from loading data everytime the
-        # server starts.
-        if index_name not in indices:
-            batch = []
-            for agent in self.agents_by_cui.values():
-                agent_dict = agent._asdict()
-                # This is the ID Algolia uses for deduplicating records.
-                agent_dict["objectID"] = agent.cui
-                batch.append(agent_dict)
-                if len(batch) == 500:
-                    idx.save_objects(batch)
-                    batch = []
-            if len(batch) > 0:
-                idx.save_objects(batch)
-
-        return idx
+        self.graph = InteractionGraph.build(
+            self.agents_by_cui.keys(),
+            (
+                (*iid.cuis, self.get_evidence_count(iid))
+                for iid in self.sentences_by_interaction_id
+            ),
+        )
 
     def get_all_agents(self) -> List[Agent]:
         return list(self.agents_by_cui.values())
 
+    def get_agents_after(self, cursor: Optional[str] = None) -> Iterator[Agent]:
+        """
+        Yields the agents in ascending order of their cui, starting after the
+        agent with the provided cui. If no cui is provided, all agents are
+        yielded.
+        """
+        cuis = self.graph.cuis
+        start = 0 if cursor is None else bisect_right(cuis, cursor.upper())
+        for cui in islice(cuis, start, None):
+            yield self.agents_by_cui[cui]
+
     def get_all_interactions(self) -> List[InteractionIdWithSlug]:
         return [
             InteractionIdWithSlug(iid, self.get_interaction_id_slug(iid))
@@ -425,13 +683,34 @@ class InteractionIndex:
             return None
         return self.agents_by_cui[cui]
 
+    def get_agent_cost(self, cui: str) -> int:
+        """
+        Returns an estimate of the work required to retrieve the interactions
+        of the agent with the provided cui, and the evidence for them.
+        """
+        agent = self.get_agent(cui)
+        if agent is None:
+            return 1
+        return (
+            1
+            + len(self.get_interaction_refs(agent))
+            + self.sentence_count_by_cui.get(agent.cui, 0)
+        )
+
+    def get_interaction_cost(self, interaction_id: InteractionId) -> int:
+        """
+        Returns an estimate of the work required to retrieve the evidence for
+        the provided interaction.
+        """
+        return 1 + len(self.sentences_by_interaction_id.get(interaction_id, []))
+
     def get_agent_with_interaction_count(
         self, cui: str, matches: Dict[str, List[str]] = {}
     ) -> Optional[AgentWithInteractionCount]:
         agent = self.get_agent(cui)
         if agent is None:
             return None
-        interactions = self.get_interactions(agent)
+        interactions = self.get_interaction_refs(agent)
         args = list(agent._asdict().values()) + [len(interactions), matches]
         return AgentWithInteractionCount(*args)
 
@@ -472,11 +751,21 @@ class InteractionIndex:
             resp["hitsPerPage"],
         )
 
-    def get_evidence(self, interaction_id: InteractionId) -> List[Evidence]:
+    def get_evidence(
+        self,
+        interaction_id: InteractionId,
+        evidence_filter: Optional[EvidenceFilter] = None,
+    ) -> List[Evidence]:
         if interaction_id not in self.sentences_by_interaction_id:
             return []
+        if evidence_filter is not None and evidence_filter.is_empty():
+            evidence_filter = None
         sentences_by_paper_id: Dict[str, List[SupportingSentence]] = {}
         for sentence in self.sentences_by_interaction_id[interaction_id]:
+            if evidence_filter is not None and not self.paper_matches(
+                sentence.paper_id, evidence_filter
+            ):
+                continue
             if sentence.paper_id not in sentences_by_paper_id:
                 sentences_by_paper_id[sentence.paper_id] = []
             sentences_by_paper_id[sentence.paper_id].append(sentence)
@@ -509,6 +798,101 @@ class InteractionIndex:
         )
         return evidence
 
+    def paper_matches(self, paper_id: str, evidence_filter: EvidenceFilter) -> bool:
+        flags = self.paper_flags_by_id.get(paper_id)
+        if flags is None:
+            return False
+        if not evidence_filter.has_years():
+            return evidence_filter.matches_flags(flags)
+        return evidence_filter.matches(flags, self.paper_metadata_by_id[paper_id].year)
+
+    def get_evidence_count(
+        self,
+        interaction_id: InteractionId,
+        evidence_filter: Optional[EvidenceFilter] = None,
+    ) -> int:
+        """
+        Returns the number of papers with metadata that are evidence of the
+        provided interaction, which is the number of items `get_evidence()`
+        returns.
+        """
+        if evidence_filter is None or evidence_filter.is_empty():
+            return len(self.paper_ids_by_interaction_id.get(interaction_id, []))
+        if evidence_filter.has_years():
+            return sum(
+                1
+                for paper_id in self.paper_ids_by_interaction_id.get(interaction_id, [])
+                if self.paper_matches(paper_id, evidence_filter)
+            )
+        return sum(
+            count
+            for flags, count in self.flag_counts_by_interaction_id.get(
+                interaction_id, {}
+            ).items()
+            if evidence_filter.matches_flags(flags)
+        )
+
+    def get_top_neighbors(self, agent: Agent, n: int) -> List[NeighborAgent]:
+        """
+        Returns the n agents the provided agent interacts with that have the
+        most evidence.
+        """
+        return [
+            NeighborAgent(self.agents_by_cui[cui], 1, weight)
+            for cui, weight in self.graph.top_neighbors(agent.cui, n)
+        ]
+
+    def get_two_hop_neighbors(self, agent: Agent) -> List[NeighborAgent]:
+        """
+        Returns the agents the provided agent interacts with, followed by the
+        agents they interact with.
+        """
+        return [
+            NeighborAgent(self.agents_by_cui[cui], hops, weight)
+            for cui, hops, weight in self.graph.two_hop_neighbors(agent.cui)
+        ]
+
+    def get_shared_neighbors(self, agents: List[Agent]) -> List[SharedNeighborAgent]:
+        """
+        Returns the agents that interact with every one of the provided agents.
+        """
+        return [
+            SharedNeighborAgent(self.agents_by_cui[cui], weights)
+            for cui, weights in self.graph.shared_neighbors(
+                [agent.cui for agent in agents]
+            )
+        ]
+
+    def get_paper(self, pid: str) -> Optional[Paper]:
+        return self.paper_metadata_by_id.get(pid)
+
+    def has_paper(self, pid: str) -> bool:
+        """
+        Returns True if the paper has metadata or is evidence of at least one
+        interaction.
+        """
+        return pid in self.paper_metadata_by_id or pid in self.sentence_refs_by_paper_id
+
+    def get_paper_interactions(self, pid: str) -> List[PaperInteraction]:
+        """
+        Returns the interactions the provided paper is evidence of, in the
+        order they were loaded.
+        """
+        uids_by_interaction_id: Dict[InteractionId, List[int]] = {}
+        for interaction_id, uid in self.sentence_refs_by_paper_id.get(pid, []):
+            if interaction_id not in uids_by_interaction_id:
+                uids_by_interaction_id[interaction_id] = []
+            uids_by_interaction_id[interaction_id].append(uid)
+        return [
+            PaperInteraction(
+                str(interaction_id),
+                self.get_interaction_id_slug(interaction_id),
+                [self.get_agent(cui) for cui in interaction_id.cuis],
+                uids,
+            )
+            for interaction_id, uids in uids_by_interaction_id.items()
+        ]
+
     def get_interaction_id_slug(self, interaction_id: InteractionId) -> str:
         def get_slug(cui: str) -> str:
             a = self.get_agent(cui)
@@ -518,52 +902,236 @@ class InteractionIndex:
 
         return "-".join(list(map(get_slug, interaction_id.cuis)))
 
-    def get_interactions(self, agent: Agent) -> List[InteractingAgent]:
-        """
-        Returns the agents the provided agent interacts with.
-        """
-        interaction_ids = self.interaction_ids_by_cui[agent.cui]
-        interactions = []
+    def build_interaction_refs(
+        self, cui: str, interaction_ids: List[InteractionId]
+    ) -> List[InteractionRef]:
+        refs = []
         for interaction_id in interaction_ids:
             interacting_agent_ids = list(
-                filter(lambda iid: iid != agent.cui, interaction_id.cuis)
+                filter(lambda iid: iid != cui, interaction_id.cuis)
             )
             if len(interacting_agent_ids) == 1:
                 [interacting_agent_id] = interacting_agent_ids
                 interacting_agent = self.get_agent(interacting_agent_id)
                 if interacting_agent is not None:
-                    agent_with_interaction = InteractingAgent(
-                        str(interaction_id),
-                        self.get_interaction_id_slug(interaction_id),
-                        interacting_agent,
-                        self.get_evidence(interaction_id),
-                    )
-                    interactions.append(agent_with_interaction)
+                    refs.append(InteractionRef(interaction_id, interacting_agent))
                 else:
                     logger.warn(
                         f"Interaction id that references a missing CUI: {interacting_agent_id}, IID: {interaction_id}"
                     )
             else:
                 logger.warn(
-                    f"Malformed interaction id: {interaction_id}, agent CUI: {agent.cui}"
+                    f"Malformed interaction id: {interaction_id}, agent CUI: {cui}"
                 )
+        return refs
+
+    def interaction_sort_keys(self) -> Dict[str, Callable[[InteractionRef], Tuple]]:
+        """
+        Returns the function used to produce each of the supported orderings
+        of an agent's interactions.
+        """
+
+        def by_evidence(ref: InteractionRef) -> Tuple:
+            return (
+                -1 * self.get_evidence_count(ref.interaction_id),
+                ref.agent.preferred_name,
+            )
+
+        def by_recent(ref: InteractionRef) -> Tuple:
+            latest = self.latest_year_by_interaction_id.get(ref.interaction_id)
+            return (latest is None, -1 * (latest or 0), *by_evidence(ref))
+
+        def by_clinical(ref: InteractionRef) -> Tuple:
+            clinical_count = sum(
+                count
+                for flags, count in self.flag_counts_by_interaction_id.get(
+                    ref.interaction_id, {}
+                ).items()
+                if flags & CLINICAL_STUDY
+            )
+            return (-1 * clinical_count, *by_evidence(ref))
+
+        def by_name(ref: InteractionRef) -> Tuple:
+            return (ref.agent.preferred_name.lower(), ref.agent.preferred_name)
+
+        return {
+            "evidence": by_evidence,
+            "recent": by_recent,
+            "clinical": by_clinical,
+            "name": by_name,
+        }
+
+    def get_interaction_refs(
+        self,
+        agent: Agent,
+        evidence_filter: Optional[EvidenceFilter] = None,
+        sort: str = "evidence",
+    ) -> List[InteractionRef]:
+        """
+        Returns references to the interactions of the provided agent, in the
+        requested order (see `INTERACTION_SORTS`). Each ordering is computed
+        when the index is loaded, so without a filter this doesn't do any work.
 
+        If a filter is provided only interactions with evidence that matches
+        it are included. When ordered by evidence, they're ordered by the
+        amount of matching evidence. The other orders are left as is.
+        """
+        if sort not in INTERACTION_SORTS:
+            raise ValueError(f"Unknown sort: {sort}")
+        refs = self.interaction_refs_by_cui.get(agent.cui, {}).get(sort, [])
+        if evidence_filter is None or evidence_filter.is_empty():
+            return refs
+        counts = {
+            ref.interaction_id: self.get_evidence_count(
+                ref.interaction_id, evidence_filter
+            )
+            for ref in refs
+        }
+        refs = [ref for ref in refs if counts[ref.interaction_id] > 0]
+        if sort != "evidence":
+            return refs
         return sorted(
-            interactions,
-            key=lambda intr: (-1 * len(intr.evidence), intr.agent.preferred_name),
+            refs,
+            key=lambda ref: (-1 * counts[ref.interaction_id], ref.agent.preferred_name),
         )
 
-    @staticmethod
-    def from_data(archive_name: str, data_dir: str) -> "InteractionIndex":
+    def get_interacting_agent(
+        self, ref: InteractionRef, evidence_filter: Optional[EvidenceFilter] = None
+    ) -> InteractingAgent:
+        return InteractingAgent(
+            str(ref.interaction_id),
+            self.get_interaction_id_slug(ref.interaction_id),
+            ref.agent,
+            self.get_evidence(ref.interaction_id, evidence_filter),
+        )
+
+    def get_interactions(
+        self,
+        agent: Agent,
+        evidence_filter: Optional[EvidenceFilter] = None,
+        sort: str = "evidence",
+    ) -> List[InteractingAgent]:
+        """
+        Returns the agents the provided agent interacts with.
+        """
+        return [
+            self.get_interacting_agent(ref, evidence_filter)
+            for ref in self.get_interaction_refs(agent, evidence_filter, sort)
+        ]
+
+    def apply_delta(self, delta: Dict) -> "InteractionIndex":
+        """
+        Returns the index for the version of the data that the provided delta
+        (see `app.delta`) produces. Only the records that were added or that
+        changed are parsed, everything else is shared with this index, which
+        isn't modified.
+
+        Raises a RuntimeError if the delta isn't for this version of the data.
+        """
+        if delta["from_version"] != self.version:
+            raise RuntimeError(
+                f"Delta is for version {delta['from_version']}, not {self.version}"
+            )
+
+        agents_by_cui = dict(self.agents_by_cui)
+        for raw_cui in delta["agents"]["remove"]:
+            agents_by_cui.pop(raw_cui.upper(), None)
+        for raw_cui, fields in delta["agents"]["upsert"].items():
+            agents_by_cui[raw_cui.upper()] = Agent.from_json(raw_cui.upper(), fields)
+
+        sentences_by_interaction_id = dict(self.sentences_by_interaction_id)
+        sentence_cache = SentenceCache()
+        for interaction_id_str in delta["sentences"]["remove"]:
+            sentences_by_interaction_id.pop(
+                InteractionId.from_str(interaction_id_str), None
+            )
+        for interaction_id_str, changes in delta["sentences"]["upsert"].items():
+            interaction_id = InteractionId.from_str(interaction_id_str)
+            # Sentences that didn't change are reused, the delta only
+            # includes those that are new or changed.
+            sentences_by_uid = {
+                sentence.uid: sentence
+                for sentence in sentences_by_interaction_id.get(interaction_id, [])
+            }
+            for fields in changes["upsert"]:
+                sentences_by_uid[fields["uid"]] = SupportingSentence.from_json(
+                    fields, sentence_cache
+                )
+            missing = [uid for uid in changes["uids"] if uid not in sentences_by_uid]
+            if len(missing) > 0:
+                raise RuntimeError(
+                    f"Delta references missing sentences: {missing}, IID: {interaction_id}"
+                )
+            sentences_by_interaction_id[interaction_id] = [
+                sentences_by_uid[uid] for uid in changes["uids"]
+            ]
+
+        interaction_ids_by_cui = dict(self.interaction_ids_by_cui)
+        for cui in delta["interaction_ids"]["remove"]:
+            interaction_ids_by_cui.pop(cui, None)
+        for cui, interaction_ids in delta["interaction_ids"]["upsert"].items():
+            interaction_ids_by_cui[cui] = list(
+                map(InteractionId.from_str, interaction_ids)
+            )
+
+        paper_metadata_by_id = dict(self.paper_metadata_by_id)
+        for paper_id in delta["papers"]["remove"]:
+            paper_metadata_by_id.pop(paper_id, None)
+        for paper_id, paper in delta["papers"]["upsert"].items():
+            paper_metadata_by_id[paper_id] = Paper.from_json({**paper, "pid": paper_id})
+
+        index_meta = self.index_meta
+        if delta["meta"] is not None:
+            index_meta = IndexMetadata(delta["meta"]["last_updated_on"])
+
         return InteractionIndex(
-            archive_name.split(".")[0],
-            InteractionIndex.load_agents_by_cui(data_dir),
-            InteractionIndex.load_sentences_by_interaction_id(data_dir),
-            InteractionIndex.load_interaction_ids_by_cui(data_dir),
-            InteractionIndex.load_paper_metadata(data_dir),
-            InteractionIndex.load_index_metadata(data_dir),
+            delta["to_version"],
+            agents_by_cui,
+            sentences_by_interaction_id,
+            interaction_ids_by_cui,
+            paper_metadata_by_id,
+            index_meta,
         )
 
+    @staticmethod
+    def load_delta(delta_path: str) -> Dict:
+        with open(delta_path) as fp:
+            return load(fp)
+
+    @staticmethod
+    def from_data(
+        archive_name: str, data_dir: str, progress: Optional[LoadProgress] = None
+    ) -> "InteractionIndex":
+        """
+        Loads the index from the datafiles in the provided directory. If
+        progress is provided, each datafile is loaded in a separate phase.
+        """
+        if progress is None:
+            progress = LoadProgress()
+        with progress.phase("agents"):
+            agents_by_cui = InteractionIndex.load_agents_by_cui(data_dir)
+        with progress.phase("sentences"):
+            sentences_by_interaction_id = InteractionIndex.load_sentences_by_interaction_id(
+                data_dir
+            )
+        with progress.phase("interaction_ids"):
+            interaction_ids_by_cui = InteractionIndex.load_interaction_ids_by_cui(
+                data_dir
+            )
+        with progress.phase("papers"):
+            paper_metadata_by_id = InteractionIndex.load_paper_metadata(data_dir)
+        with progress.phase("index_meta"):
+            index_meta = InteractionIndex.load_index_metadata(data_dir)
+        with progress.phase("index"):
+            return InteractionIndex(
+                archive_name.split(".")[0],
+                agents_by_cui,
+                sentences_by_interaction_id,
+                interaction_ids_by_cui,
+                paper_metadata_by_id,
+                index_meta,
+            )
+
     @staticmethod
     def load_agents_by_cui(data_dir: str) -> Dict[str, Agent]:
         agents_by_cui: Dict[str, Agent] = {}
@@ -573,9 +1141,7 @@ class InteractionIndex:
                 cui = raw_cui.upper()
                 if cui in agents_by_cui:
                     raise RuntimeError(f"Duplicate cui: {cui}")
-                agents_by_cui[cui] = Agent(
-                    **{**{"cui": cui, "slug": slug(fields["preferred_name"])}, **fields}
-                )
+                agents_by_cui[cui] = Agent.from_json(cui, fields)
         return agents_by_cui
 
     @staticmethod
@@ -583,15 +1149,19 @@ class InteractionIndex:
         data_dir: str
     ) -> Dict[InteractionId, List[SupportingSentence]]:
         sentences_by_interaction_id: Dict[InteractionId, List[SupportingSentence]] = {}
+        # The words of each sentence are only counted once, even if it's
+        # evidence of more than one interaction.
+        sentence_cache = SentenceCache()
         with open(path.join(data_dir, "sentence_dict.json")) as fp:
             raw = load(fp)
             for [interaction_id_str, sentences] in raw.items():
                 interaction_id = InteractionId.from_str(interaction_id_str)
                 if interaction_id in sentences_by_interaction_id:
                     raise RuntimeError(f"Duplicate interaction id: {interaction_id}")
-                sentences_by_interaction_id[interaction_id] = list(
-                    map(SupportingSentence.from_json, sentences)
-                )
+                sentences_by_interaction_id[interaction_id] = [
+                    SupportingSentence.from_json(fields, sentence_cache)
+                    for fields in sentences
+                ]
         return sentences_by_interaction_id
 
     @staticmethod
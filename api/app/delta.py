@@ -0,0 +1,160 @@
+import argparse
+import json
+import tarfile
+import logging
+from typing import Any, Dict, List, Optional
+from os import path
+
+logger = logging.getLogger(__name__)
+
+# The datafiles that make up an archive, see `InteractionIndex.from_data`.
+AGENTS_FILE = "cui_metadata.json"
+SENTENCES_FILE = "sentence_dict.json"
+INTERACTION_IDS_FILE = "interaction_id_dict.json"
+PAPERS_FILE = "paper_metadata.json"
+META_FILE = "meta.json"
+
+
+def version_of(archive: str) -> str:
+    """
+    Returns the version of the data in the provided archive, which is derived
+    from its name in the same way as it is when the index is loaded.
+    """
+    return path.basename(path.normpath(archive)).split(".")[0]
+
+
+def read_datafile(archive: str, name: str) -> Any:
+    """
+    Returns the parsed contents of a datafile from the provided archive, which
+    can either be a directory or a tar file (like those that are downloaded by
+    `download_data.py`).
+    """
+    if path.isdir(archive):
+        with open(path.join(archive, name)) as fp:
+            return json.load(fp)
+    with tarfile.open(archive) as tar:
+        for member in tar:
+            if member.isfile() and path.basename(member.name) == name:
+                member_fp = tar.extractfile(member)
+                if member_fp is not None:
+                    return json.load(member_fp)
+    raise RuntimeError(f"{name} not found in {archive}")
+
+
+def diff_records(old: Dict[str, Any], new: Dict[str, Any]) -> Dict:
+    """
+    Returns the records that were added or changed, keyed by their id, and the
+    ids of those that were removed.
+    """
+    return {
+        "upsert": {key: value for key, value in new.items() if old.get(key) != value},
+        "remove": [key for key in old if key not in new],
+    }
+
+
+def diff_sentences(old: Dict[str, List[Dict]], new: Dict[str, List[Dict]]) -> Dict:
+    """
+    Returns the changes to the sentences of each interaction, and the ids of
+    the interactions that were removed.
+
+    Sentences are identified by their uid. For each interaction whose
+    sentences changed, the uids of all of its sentences are included (in
+    order), but only the sentences that were added or changed are.
+    """
+    upsert: Dict[str, Dict] = {}
+    for interaction_id, sentences in new.items():
+        old_sentences = old.get(interaction_id)
+        if old_sentences == sentences:
+            continue
+        old_by_uid = {sentence["uid"]: sentence for sentence in old_sentences or []}
+        upsert[interaction_id] = {
+            "uids": [sentence["uid"] for sentence in sentences],
+            "upsert": [
+                sentence
+                for sentence in sentences
+                if old_by_uid.get(sentence["uid"]) != sentence
+            ],
+        }
+    return {
+        "upsert": upsert,
+        "remove": [
+            interaction_id for interaction_id in old if interaction_id not in new
+        ],
+    }
+
+
+def create_delta(
+    old_archive: str,
+    new_archive: str,
+    from_version: Optional[str] = None,
+    to_version: Optional[str] = None,
+) -> Dict:
+    """
+    Returns the delta between two archives, which can be applied to an index
+    loaded from the first to produce the index for the second, via
+    `InteractionIndex.apply_delta`.
+
+    The datafiles are compared one at a time, so at most two of them (one from
+    each archive) are held in memory.
+    """
+    delta: Dict[str, Any] = {
+        "from_version": from_version or version_of(old_archive),
+        "to_version": to_version or version_of(new_archive),
+    }
+    for key, name in [
+        ("agents", AGENTS_FILE),
+        ("interaction_ids", INTERACTION_IDS_FILE),
+        ("papers", PAPERS_FILE),
+    ]:
+        delta[key] = diff_records(
+            read_datafile(old_archive, name), read_datafile(new_archive, name)
+        )
+        logger.info(
+            f"{name}: {len(delta[key]['upsert'])} upserted, "
+            + f"{len(delta[key]['remove'])} removed"
+        )
+    delta["sentences"] = diff_sentences(
+        read_datafile(old_archive, SENTENCES_FILE),
+        read_datafile(new_archive, SENTENCES_FILE),
+    )
+    logger.info(
+        f"{SENTENCES_FILE}: {len(delta['sentences']['upsert'])} interactions "
+        + f"upserted, {len(delta['sentences']['remove'])} removed"
+    )
+    old_meta = read_datafile(old_archive, META_FILE)
+    new_meta = read_datafile(new_archive, META_FILE)
+    delta["meta"] = new_meta if new_meta != old_meta else None
+    return delta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Writes the delta between two data archives, which can be "
+        + "applied to the index loaded from the first to produce the second."
+    )
+    parser.add_argument(
+        "old", help="The archive (or directory with its datafiles) to diff from."
+    )
+    parser.add_argument(
+        "new", help="The archive (or directory with its datafiles) to diff to."
+    )
+    parser.add_argument(
+        "--output", "-o", help="The file to write the delta to.", required=True
+    )
+    parser.add_argument(
+        "--from-version",
+        help="The version of the old archive. By default it's derived from "
+        + "the name of the archive.",
+    )
+    parser.add_argument(
+        "--to-version",
+        help="The version of the new archive. By default it's derived from "
+        + "the name of the archive.",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    delta = create_delta(args.old, args.new, args.from_version, args.to_version)
+    with open(args.output, "w") as fp:
+        json.dump(delta, fp)
@@ -0,0 +1,174 @@
+import argparse
+import sys
+import logging
+from typing import Dict, Iterator, Optional, TextIO
+from os import environ
+from app.data import InteractionIndex, Agent
+from app.serialize import Encoder
+from app.admission import Deadline, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+ENT_TYPES = ["supplement", "drug", "other"]
+
+
+def export(
+    idx: InteractionIndex,
+    cursor: Optional[str] = None,
+    ent_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[Dict]:
+    """
+    Yields a page of the corpus, one record at a time. Agents are exported in
+    ascending order of their cui, starting after the agent with the provided
+    cui (the cursor). Each agent is followed by its interactions, which
+    include all of the evidence for them.
+
+    Each interaction is exported once, with the agent that has the lowest cui.
+    If ent_type is set only agents of that type are exported, in which case
+    interactions with an agent of another type are exported with the agent
+    that has the provided type.
+
+    At most limit agents are exported. The last record describes the page,
+    and includes the cursor for the next one, which is None if there isn't
+    one.
+
+    Only the record that's being exported is held in memory, so the memory
+    that's used doesn't depend on the size of the corpus.
+
+    The deadline is checked before each agent is exported. If it's passed the
+    page ends early, after the last agent that was exported in full, and its
+    cursor is where the export can be resumed from. The deadline's checkpoint
+    is also called before each interaction, so that other requests can be
+    handled while the page is produced (see `app.admission`).
+    """
+    deadline = deadline or Deadline(None)
+
+    def included(agent: Agent) -> bool:
+        return ent_type is None or agent.ent_type == ent_type
+
+    exported = 0
+    next_cursor = None
+    for agent in idx.get_agents_after(cursor):
+        if not included(agent):
+            continue
+        if limit is not None and exported == limit:
+            next_cursor = cursor
+            break
+        try:
+            deadline.check()
+        except DeadlineExceeded:
+            logger.warning(f"The export ran out of time after {cursor}")
+            next_cursor = cursor
+            break
+        yield {"type": "agent", "agent": agent}
+        for ref in idx.get_interaction_refs(agent):
+            if included(ref.agent) and ref.agent.cui < agent.cui:
+                continue
+            deadline.checkpoint()
+            yield {
+                "type": "interaction",
+                "interaction_id": str(ref.interaction_id),
+                "slug": idx.get_interaction_id_slug(ref.interaction_id),
+                "agents": [agent, ref.agent],
+                "evidence": idx.get_evidence(ref.interaction_id),
+            }
+        exported += 1
+        cursor = agent.cui
+    yield {"type": "page", "agents": exported, "next_cursor": next_cursor}
+
+
+def export_ndjson(
+    idx: InteractionIndex,
+    cursor: Optional[str] = None,
+    ent_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    encoder: Optional[Encoder] = None,
+    deadline: Optional[Deadline] = None,
+) -> Iterator[str]:
+    """
+    Yields a page of the corpus (see `export()`) as newline delimited JSON,
+    one line at a time.
+    """
+    encoder = encoder or Encoder()
+    for record in export(idx, cursor, ent_type, limit, deadline):
+        yield encoder.dumps(record) + "\n"
+
+
+def export_all(
+    idx: InteractionIndex,
+    out: TextIO,
+    cursor: Optional[str] = None,
+    ent_type: Optional[str] = None,
+    page_size: int = 1000,
+) -> None:
+    """
+    Writes the entire corpus to the provided file, page by page. The record
+    at the end of each page includes the cursor that an interrupted export
+    can be resumed from.
+    """
+    encoder = Encoder()
+    while True:
+        next_cursor = None
+        for record in export(idx, cursor, ent_type, page_size):
+            encoder.dump(record, out.write)
+            out.write("\n")
+            if record["type"] == "page":
+                next_cursor = record["next_cursor"]
+        out.flush()
+        if next_cursor is None:
+            break
+        logger.info(f"Exported all agents up to {next_cursor}")
+        cursor = next_cursor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Exports the interaction corpus as newline delimited JSON."
+    )
+    parser.add_argument(
+        "--archive",
+        help="The name of the data archive to export.",
+        default=environ.get("SUPPAI_DATA_ARCHIVE"),
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Path to a directory containing the datafiles that makeup the "
+        + "collection of interactions.",
+        default="/usr/local/data/skiff",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        help="The file to write to. If not specified the export is written "
+        + "to stdout.",
+        default=None,
+    )
+    parser.add_argument(
+        "--cursor",
+        help="Resume the export after the agent with this cui, as reported "
+        + "at the end of each page.",
+        default=None,
+    )
+    parser.add_argument(
+        "--ent-type", help="Only export agents of this type.", choices=ENT_TYPES
+    )
+    parser.add_argument(
+        "--page-size", help="The number of agents per page.", default=1000, type=int
+    )
+    args = parser.parse_args()
+    if args.archive is None:
+        parser.error("--archive is required when SUPPAI_DATA_ARCHIVE isn't set.")
+
+    # Log messages are written to stderr, so that they're not mixed in with
+    # the export when it's written to stdout.
+    logging.basicConfig(level=logging.INFO)
+
+    idx = InteractionIndex.from_data(args.archive, args.data_dir)
+    if args.output is None:
+        export_all(idx, sys.stdout, args.cursor, args.ent_type, args.page_size)
+    else:
+        # Resumed exports are appended to the existing output.
+        with open(args.output, "a" if args.cursor else "w") as out:
+            export_all(idx, out, args.cursor, args.ent_type, args.page_size)
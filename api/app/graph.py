@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np  # type: ignore
+
+
+class InteractionGraph:
+    """
+    The graph of interactions between agents, in compressed sparse row (CSR)
+    form. Each agent is assigned an integer, and the agents it interacts with
+    are `indices[indptr[i]:indptr[i + 1]]`, sorted in ascending order. The
+    weight of each edge is the number of papers that are evidence of the
+    interaction, and is stored in `weights` at the same position.
+
+    This allows questions that involve more than one agent, like which agents
+    interact with both X and Y, to be answered with vectorized operations.
+    """
+
+    def __init__(
+        self,
+        cuis: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: np.ndarray,
+    ):
+        self.cuis = cuis
+        self.node_by_cui: Dict[str, int] = {cui: i for i, cui in enumerate(cuis)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @staticmethod
+    def build(
+        cuis: Iterable[str], edges: Iterable[Tuple[str, str, int]]
+    ) -> "InteractionGraph":
+        """
+        Builds a graph with the provided agents, and an undirected edge for
+        each of the provided (cui, cui, weight) tuples. Edges that reference
+        an agent that isn't in the graph are ignored, and the weights of
+        duplicate edges are summed.
+        """
+        nodes = sorted(set(cuis))
+        node_by_cui = {cui: i for i, cui in enumerate(nodes)}
+        weight_by_pair: Dict[Tuple[int, int], int] = {}
+        for first, second, weight in edges:
+            if first not in node_by_cui or second not in node_by_cui:
+                continue
+            if first == second:
+                continue
+            pair = (node_by_cui[first], node_by_cui[second])
+            pair = (min(pair), max(pair))
+            weight_by_pair[pair] = weight_by_pair.get(pair, 0) + weight
+
+        sources: List[int] = []
+        targets: List[int] = []
+        edge_weights: List[int] = []
+        for (first_node, second_node), weight in weight_by_pair.items():
+            sources += [first_node, second_node]
+            targets += [second_node, first_node]
+            edge_weights += [weight, weight]
+
+        src = np.array(sources, dtype=np.int32)
+        dst = np.array(targets, dtype=np.int32)
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+        return InteractionGraph(
+            nodes,
+            indptr,
+            dst[order],
+            np.array(edge_weights, dtype=np.int32)[order],
+        )
+
+    def node(self, cui: str) -> Optional[int]:
+        return self.node_by_cui.get(cui)
+
+    def row(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the neighbors of the provided node, and the weight of the edge
+        to each.
+        """
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def top_neighbors(self, cui: str, n: int) -> List[Tuple[str, int]]:
+        """
+        Returns the n neighbors of the provided agent with the most evidence,
+        and the amount of evidence for each.
+        """
+        node = self.node(cui)
+        if node is None:
+            return []
+        neighbors, weights = self.row(node)
+        # Neighbors are sorted by cui, and the sort is stable, so ties are
+        # broken by cui.
+        top = np.argsort(-weights, kind="stable")[:n]
+        return [(self.cuis[neighbors[i]], int(weights[i])) for i in top]
+
+    def shared_neighbors(self, cuis: List[str]) -> List[Tuple[str, List[int]]]:
+        """
+        Returns the agents that interact with every one of the provided agents,
+        along with the amount of evidence for each of those interactions. They
+        are ordered by the total amount of evidence.
+        """
+        nodes = [self.node(cui) for cui in cuis]
+        if len(nodes) == 0 or any(node is None for node in nodes):
+            return []
+        rows = [self.row(node) for node in nodes if node is not None]
+        shared = rows[0][0]
+        for neighbors, _ in rows[1:]:
+            shared = np.intersect1d(shared, neighbors, assume_unique=True)
+        # The neighbors of each agent we're interested in are given in the
+        # same order as the result, so we can pull each weight via a search.
+        shared_weights = np.stack(
+            [weights[np.searchsorted(neighbors, shared)] for neighbors, weights in rows]
+        )
+        order = np.argsort(-shared_weights.sum(axis=0), kind="stable")
+        return [
+            (self.cuis[shared[i]], [int(w) for w in shared_weights[:, i]])
+            for i in order
+        ]
+
+    def two_hop_neighbors(self, cui: str) -> List[Tuple[str, int, int]]:
+        """
+        Returns the agents within two hops of the provided agent, as
+        (cui, hops, weight) tuples. For direct neighbors the weight is the
+        amount of evidence for the interaction. For those two hops away, it's
+        the number of agents through which they're connected.
+
+        Direct neighbors are listed first, then those two hops away, and each
+        group is ordered by weight.
+        """
+        node = self.node(cui)
+        if node is None:
+            return []
+        neighbors, weights = self.row(node)
+
+        # Gather the neighbors of each neighbor in a single array, without
+        # iterating over them in Python.
+        starts = self.indptr[neighbors]
+        lengths = self.indptr[neighbors + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        second = self.indices[offsets + np.arange(lengths.sum())]
+
+        paths = np.bincount(second, minlength=len(self.cuis))
+        paths[node] = 0
+        paths[neighbors] = 0
+        two_hop = np.nonzero(paths)[0]
+        two_hop_weights = paths[two_hop]
+
+        first_order = np.argsort(-weights, kind="stable")
+        second_order = np.argsort(-two_hop_weights, kind="stable")
+        return [(self.cuis[neighbors[i]], 1, int(weights[i])) for i in first_order] + [
+            (self.cuis[two_hop[i]], 2, int(two_hop_weights[i])) for i in second_order
+        ]
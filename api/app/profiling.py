@@ -0,0 +1,167 @@
+import sys
+import json
+import platform
+import resource
+import tracemalloc
+import numpy as np  # type: ignore
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from os import path
+from threading import Lock
+from time import perf_counter, thread_time
+from typing import Any, Dict, Iterator, List, Optional
+
+# The structures held by `InteractionIndex` whose size is estimated, which
+# are the largest ones.
+PROFILED_STRUCTURES = [
+    "agents_by_cui",
+    "sentences_by_interaction_id",
+    "paper_metadata_by_id",
+    "cuis_by_name",
+    "interaction_ids_by_cui",
+    "interaction_refs_by_cui",
+    "paper_ids_by_interaction_id",
+    "sentence_refs_by_paper_id",
+]
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Returns the resident set size of the process, if it can be determined.
+    """
+    statm = "/proc/self/statm"
+    if not path.exists(statm):
+        return None
+    with open(statm) as fp:
+        pages = int(fp.read().split()[1])
+    return pages * resource.getpagesize()
+
+
+def max_rss_bytes() -> int:
+    # Linux reports the maximum resident set size in kilobytes, macOS in
+    # bytes.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def deep_size(value: Any) -> int:
+    """
+    Returns an estimate of the memory used by the provided value, and
+    everything it references. Values that are referenced more than once are
+    only counted once.
+    """
+    seen = set()
+    size = 0
+    stack = [value]
+    while len(stack) > 0:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if isinstance(current, np.ndarray):
+            size += current.nbytes + sys.getsizeof(current)
+            continue
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, "__dict__"):
+            stack.append(current.__dict__)
+    return size
+
+
+class LoadProfiler:
+    """
+    Measures the wall time, CPU time and memory used by each phase of the work
+    done to get the API ready, see `app.progress.LoadProgress`.
+
+    The memory allocated during each phase is traced via `tracemalloc`, which
+    slows things down, so profiling is opt-in.
+    """
+
+    def __init__(self):
+        self.phases: List[Dict] = []
+        self.lock = Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.started = perf_counter()
+        tracemalloc.start()
+
+    def reset_peak(self) -> int:
+        """
+        Resets the peak that's traced, and returns the amount of memory that
+        it's measured relative to.
+        """
+        # Python 3.9 added `reset_peak()`. Before that, we can only reset the
+        # peak by forgetting about the memory that's already allocated.
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            return current
+        tracemalloc.clear_traces()
+        return 0
+
+    @contextmanager
+    def measure(self, name: str, trace_memory: bool = True) -> Iterator[None]:
+        """
+        Measures the work done in the context. If trace_memory is False, the
+        peak amount of memory allocated isn't measured, which should be the
+        case for work that happens at the same time as other phases.
+        """
+        baseline = self.reset_peak() if trace_memory else 0
+        wall = perf_counter()
+        cpu = thread_time()
+        try:
+            yield
+        finally:
+            measured: Dict[str, Any] = {
+                "name": name,
+                "wall_seconds": round(perf_counter() - wall, 3),
+                "cpu_seconds": round(thread_time() - cpu, 3),
+                "tracemalloc_peak_bytes": None,
+                "rss_bytes": rss_bytes(),
+                "max_rss_bytes": max_rss_bytes(),
+            }
+            if trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                measured["tracemalloc_peak_bytes"] = peak - baseline
+            with self.lock:
+                self.phases.append(measured)
+
+    def report(self, idx: Any) -> Dict:
+        """
+        Returns the measurements taken so far, and an estimate of the size of
+        each of the largest structures held by the provided index. The time
+        and memory used are measured before the structures are, as estimating
+        their size takes a while.
+        """
+        with self.lock:
+            phases = list(self.phases)
+        report = {
+            "version": idx.version,
+            "python": platform.python_version(),
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": round(perf_counter() - self.started, 3),
+            "rss_bytes": rss_bytes(),
+            "max_rss_bytes": max_rss_bytes(),
+            "phases": phases,
+        }
+        structures = {}
+        for name in PROFILED_STRUCTURES:
+            value = getattr(idx, name, None)
+            if value is None:
+                continue
+            structures[name] = {"entries": len(value), "bytes": deep_size(value)}
+        return {**report, "structures": structures}
+
+    def write(self, report_path: str, idx: Any) -> None:
+        """
+        Stops tracing memory, and writes the report to the provided path.
+        Tracing slows down everything that allocates memory, including
+        estimating the size of the index, so it's stopped first.
+        """
+        tracemalloc.stop()
+        report = self.report(idx)
+        with open(report_path, "w") as fp:
+            json.dump(report, fp, indent=2)
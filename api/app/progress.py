@@ -0,0 +1,87 @@
+from typing import Callable, ContextManager, Dict, Iterable, List, Optional
+from contextlib import contextmanager
+from threading import Lock
+from time import time
+
+
+class Phase:
+    """
+    A single phase of the work done to get the API ready for traffic, like
+    loading a data file.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "pending"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def as_json(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time()) - self.started_at, 3)
+        return {
+            "name": self.name,
+            "status": self.status,
+            "elapsed_seconds": elapsed,
+            "error": self.error,
+        }
+
+
+class LoadProgress:
+    """
+    Tracks the progress of each of the phases that have to complete before
+    the API is ready. The names of the phases that are expected can be
+    provided up front, so that they're reported before they start.
+
+    If measure is provided, each phase runs in the context it returns for the
+    phase's name, which allows the phases to be profiled.
+    """
+
+    def __init__(
+        self,
+        phases: Iterable[str] = (),
+        measure: Optional[Callable[[str], ContextManager]] = None,
+    ):
+        self.phases: Dict[str, Phase] = {name: Phase(name) for name in phases}
+        self.measure = measure
+        self.lock = Lock()
+        self.error: Optional[str] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        with self.lock:
+            if name not in self.phases:
+                self.phases[name] = Phase(name)
+            phase = self.phases[name]
+        phase.status = "running"
+        phase.started_at = time()
+        try:
+            if self.measure is None:
+                yield phase
+            else:
+                with self.measure(name):
+                    yield phase
+        except Exception as err:
+            phase.status = "failed"
+            phase.error = str(err)
+            raise
+        finally:
+            phase.finished_at = time()
+        phase.status = "complete"
+
+    def fail(self, err: Exception) -> None:
+        """
+        Records a failure that happened outside of any phase.
+        """
+        self.error = str(err)
+
+    def failed(self) -> bool:
+        return self.error is not None or any(
+            phase.status == "failed" for phase in self.phases.values()
+        )
+
+    def as_json(self) -> List[Dict]:
+        with self.lock:
+            return [phase.as_json() for phase in self.phases.values()]
@@ -0,0 +1,63 @@
+from flask import Flask, Response
+from typing import Callable, Dict, Iterable, Optional
+from app.progress import LoadProgress
+from app.serialize import dumps
+
+
+class LoadingApp:
+    """
+    A WSGI application that's served while the API loads. Requests for the
+    liveness and readiness routes are always handled, all other requests
+    get a 503 until the API is ready.
+
+    Once the API is loaded it should be passed to `serve()`, after which all
+    other requests are handled by it.
+    """
+
+    def __init__(self, progress: LoadProgress, retry_after: int = 5):
+        self.progress = progress
+        self.retry_after = retry_after
+        self.app: Optional[Callable] = None
+        self.status_app = Flask(__name__)
+        self.status_app.add_url_rule("/health/live", "live", self.live)
+        self.status_app.add_url_rule("/health/ready", "ready", self.ready)
+
+    def serve(self, app: Callable) -> None:
+        self.app = app
+
+    def live(self) -> Response:
+        # The process isn't going to recover from a failure to load, so we
+        # report that it's dead, which causes it to be restarted.
+        status = 500 if self.progress.failed() else 200
+        return Response(
+            dumps({"live": status == 200}), status, content_type="application/json"
+        )
+
+    def ready(self) -> Response:
+        is_ready = self.app is not None
+        return Response(
+            dumps(
+                {
+                    "ready": is_ready,
+                    "phases": self.progress.as_json(),
+                    "error": self.progress.error,
+                }
+            ),
+            200 if is_ready else 503,
+            content_type="application/json",
+        )
+
+    def unavailable(self) -> Response:
+        return Response(
+            dumps({"error": "The API is loading, try again soon."}),
+            503,
+            headers={"Retry-After": str(self.retry_after)},
+            content_type="application/json",
+        )
+
+    def __call__(self, environ: Dict, start_response: Callable) -> Iterable[bytes]:
+        if environ.get("PATH_INFO") in ("/health/live", "/health/ready"):
+            return self.status_app(environ, start_response)
+        if self.app is None:
+            return self.unavailable()(environ, start_response)
+        return self.app(environ, start_response)
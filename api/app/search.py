@@ -0,0 +1,242 @@
+import argparse
+import os
+import logging
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from json import load, dump
+from os import path, environ
+from algoliasearch.search_client import SearchClient  # type: ignore
+from app.data import Agent, InteractionIndex, ALGOLIA_APP_ID, search_index_name
+import simplejson
+
+logger = logging.getLogger(__name__)
+
+# The settings we apply to the Algolia index that's used for agent search.
+INDEX_SETTINGS = {
+    "searchableAttributes": ["preferred_name", "definition", "synonyms", "tradenames"]
+}
+
+
+def agent_record(agent: Agent) -> Dict:
+    """
+    Returns the record that's written to Algolia for the provided agent.
+    """
+    record = agent._asdict()
+    # This is the ID Algolia uses for deduplicating records.
+    record["objectID"] = agent.cui
+    return record
+
+
+def digest(value: object) -> str:
+    """
+    Returns a stable digest of the provided value, which is used to detect
+    whether a record (or the index settings) changed since it was last pushed.
+    """
+    return sha1(simplejson.dumps(value, sort_keys=True).encode("utf8")).hexdigest()
+
+
+class SyncState(NamedTuple):
+    """
+    Model capturing what was last pushed to an index. The records member maps
+    each objectID to the digest of the record that was written.
+    """
+
+    settings: Optional[str]
+    records: Dict[str, str]
+
+
+class SyncResult(NamedTuple):
+    """
+    Model summarizing the changes made by a single sync.
+    """
+
+    index_name: str
+    upserted: int
+    deleted: int
+    unchanged: int
+    settings_updated: bool
+
+
+class AgentIndexSync:
+    """
+    Synchronizes the agents in a data version with the Algolia index for that
+    version. Only records that changed since the last push are uploaded, and
+    batches are sent concurrently.
+
+    What was last pushed is read from a state file in `state_dir`. If there
+    isn't one (say because the container was replaced) the state is rebuilt
+    by browsing the existing index, so that we don't re-upload everything.
+    Browsing reads every record in the index, 1000 at a time, so `state_dir`
+    should be somewhere that outlives the process when possible.
+
+    The client is anything that looks like an Algolia `SearchClient`, which
+    makes it easy to run this against a local stand-in.
+    """
+
+    def __init__(
+        self,
+        client,
+        index_name: str,
+        state_dir: Optional[str] = None,
+        batch_size: int = 500,
+        max_workers: int = 4,
+    ):
+        self.client = client
+        self.index_name = index_name
+        self.state_dir = state_dir
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.index = client.init_index(index_name)
+
+    def state_path(self) -> Optional[str]:
+        if self.state_dir is None:
+            return None
+        return path.join(self.state_dir, f"{self.index_name}.json")
+
+    def load_state(self) -> SyncState:
+        state_path = self.state_path()
+        if state_path is not None and path.exists(state_path):
+            with open(state_path) as fp:
+                raw = load(fp)
+                return SyncState(raw["settings"], raw["records"])
+        return self.remote_state()
+
+    def remote_state(self) -> SyncState:
+        resp = self.client.list_indices()
+        indices = set(map(lambda item: item["name"], resp["items"]))
+        if self.index_name not in indices:
+            return SyncState(None, {})
+        logger.info(f"No sync state for {self.index_name}, browsing the index...")
+        records: Dict[str, str] = {}
+        for hit in self.index.browse_objects():
+            record = {
+                name: value for name, value in hit.items() if not name.startswith("_")
+            }
+            records[record["objectID"]] = digest(record)
+        settings = self.index.get_settings()
+        current = {name: settings.get(name) for name in INDEX_SETTINGS}
+        return SyncState(digest(current), records)
+
+    def save_state(self, state: SyncState) -> None:
+        state_path = self.state_path()
+        if state_path is None:
+            return
+        os.makedirs(path.dirname(state_path), exist_ok=True)
+        # Write to a temporary file first, so that an interrupted sync never
+        # leaves a partial state file behind.
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as fp:
+            dump(state._asdict(), fp)
+        os.replace(tmp_path, state_path)
+
+    def batches(self, items: List) -> List[List]:
+        return [
+            items[start : start + self.batch_size]
+            for start in range(0, len(items), self.batch_size)
+        ]
+
+    def sync(self, agents: Iterable[Agent]) -> SyncResult:
+        state = self.load_state()
+
+        settings_digest = digest(INDEX_SETTINGS)
+        settings_updated = state.settings != settings_digest
+        if settings_updated:
+            self.index.set_settings(INDEX_SETTINGS)
+
+        records: Dict[str, str] = dict(state.records)
+        changed: List[Tuple[str, str, Dict]] = []
+        seen = set()
+        for agent in agents:
+            record = agent_record(agent)
+            object_id = record["objectID"]
+            seen.add(object_id)
+            record_digest = digest(record)
+            if records.get(object_id) != record_digest:
+                changed.append((object_id, record_digest, record))
+        removed = [object_id for object_id in records if object_id not in seen]
+
+        def save(batch: List) -> List:
+            self.index.save_objects([record for (_, _, record) in batch])
+            return batch
+
+        def delete(batch: List[str]) -> List[str]:
+            self.index.delete_objects(batch)
+            return batch
+
+        # The state is updated as each batch completes, so that if one fails
+        # the work done by the others isn't repeated by the next sync.
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            saves = [executor.submit(save, b) for b in self.batches(changed)]
+            deletes = [executor.submit(delete, b) for b in self.batches(removed)]
+            for future in saves:
+                try:
+                    for object_id, record_digest, _ in future.result():
+                        records[object_id] = record_digest
+                except Exception as err:
+                    errors.append(err)
+            for future in deletes:
+                try:
+                    for object_id in future.result():
+                        del records[object_id]
+                except Exception as err:
+                    errors.append(err)
+
+        self.save_state(
+            SyncState(settings_digest if settings_updated else state.settings, records)
+        )
+        if len(errors) > 0:
+            raise errors[0]
+
+        result = SyncResult(
+            self.index_name,
+            len(changed),
+            len(removed),
+            len(seen) - len(changed),
+            settings_updated,
+        )
+        logger.info(f"Synchronized search index: {result}")
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Synchronizes the agent search index with a data archive."
+    )
+    parser.add_argument(
+        "--archive",
+        help="The name of the data archive the agents are from.",
+        default=environ.get("SUPPAI_DATA_ARCHIVE"),
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Path to a directory containing the datafiles that makeup the "
+        + "collection of interactions.",
+        default="/usr/local/data/skiff",
+    )
+    parser.add_argument(
+        "--state-dir",
+        help="Path to a directory where what was last pushed is recorded.",
+        default=environ.get("SUPP_AI_SEARCH_SYNC_STATE_DIR"),
+    )
+    parser.add_argument(
+        "--batch-size", help="The number of records per request.", default=500, type=int
+    )
+    parser.add_argument(
+        "--workers", help="The number of concurrent requests.", default=4, type=int
+    )
+    args = parser.parse_args()
+    if args.archive is None:
+        parser.error("--archive is required when SUPPAI_DATA_ARCHIVE isn't set.")
+
+    logging.basicConfig(level=logging.INFO)
+
+    client = SearchClient.create(ALGOLIA_APP_ID, environ["SUPP_AI_ALGOLIA_API_KEY"])
+    AgentIndexSync(
+        client,
+        search_index_name(args.archive.split(".")[0]),
+        args.state_dir,
+        args.batch_size,
+        args.workers,
+    ).sync(InteractionIndex.load_agents_by_cui(args.data_dir).values())
@@ -1,44 +1,34 @@
 import argparse
+import json
 import os
 import sys
 import logging
-from typing import Tuple, Iterable, Optional, List
+from typing import Tuple, Iterable, Optional, List, Callable
+from threading import Thread
+from contextlib import nullcontext
+import gevent  # type: ignore
 from gevent.pywsgi import WSGIServer  # type: ignore
 from flask import Flask, Response, request, jsonify
+from werkzeug.serving import run_simple
 from jinja2 import Environment, FileSystemLoader
 from app.api import create_api
 from app.utils import StackdriverJsonFormatter
-from app.data import InteractionIndex
+from app.data import InteractionIndex, LOAD_PHASES
+from app.search import AgentIndexSync
+from app.progress import LoadProgress
+from app.readiness import LoadingApp
+from app.profiling import LoadProfiler
+from app.admission import AdmissionControl, DEFAULT_CONCURRENCY_LIMITS
+from app.admission import DEFAULT_MAX_COST, DEFAULT_DEADLINE_SECONDS, no_checkpoint
 
 
-def start(data_dir: str, port: int, prod: bool):
+def write_sitemaps(idx: InteractionIndex, static_dir: str):
     """
-    Starts up a HTTP server attached to the provider port, and optionally
-    in development mode (which is ideal for local development but unideal
-    for production use).
+    Writes a sitemap, which lists the URL of every agent and interaction, to
+    the provided directory.
     """
-
-    logging_config = {
-        "level": getattr(logging, os.environ.get("LOG_LEVEL", default="INFO"))
-    }
-
-    # If we're in production we setup a handler that writes JSON log messages
-    # in a format that Google likes.
-    if args.prod:
-        json_handler = logging.StreamHandler()
-        json_handler.setFormatter(StackdriverJsonFormatter())
-        logging_config["handlers"] = [json_handler]
-
-    logging.basicConfig(**logging_config)
-
     logger = logging.getLogger(__name__)
-    logger.debug("AHOY! Let's get this boat out to water...")
 
-    logger.debug("Starting: init agent index...")
-    idx = InteractionIndex.from_data(os.environ["SUPPAI_DATA_ARCHIVE"], data_dir)
-    logger.debug("Complete: init agent index...")
-
-    logger.debug("Starting: generate sitemap...")
     agents = idx.get_all_agents()
     origin = os.environ["SUPP_AI_CANONICAL_ORIGIN"]
     agent_urls = list(map(lambda agent: f"{origin}/a/{agent.slug}/{agent.cui}", agents))
@@ -50,7 +40,6 @@ def start(data_dir: str, port: int, prod: bool):
         )
     )
     urls = [origin] + agent_urls + interaction_urls
-    static_dir = os.environ.get("SUPP_AI_STATIC_DIR", os.path.abspath("static"))
     templates = Environment(
         loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), "templates"))
     )
@@ -84,32 +73,204 @@ def start(data_dir: str, port: int, prod: bool):
         )
         fp.write(xml.encode("utf8"))
     logger.info(f"wrote {sitemap_index_path}....")
-    logger.debug("Complete: generate sitemap....")
 
+
+def create_app(
+    idx: InteractionIndex,
+    static_dir: str,
+    checkpoint: Callable[[], None] = no_checkpoint,
+) -> Flask:
+    """
+    Returns the application that serves the API for the provided index. The
+    checkpoint is called periodically while expensive requests are handled,
+    see `app.admission.AdmissionControl`.
+    """
     app = Flask(__name__, static_folder=static_dir)
+    # The Cache-Control header sent by each route can be overridden via a
+    # JSON object that maps the name of the route's function to the value.
+    cache_control = json.loads(os.environ.get("SUPP_AI_CACHE_CONTROL", "{}"))
+    response_cache_mb = int(os.environ.get("SUPP_AI_RESPONSE_CACHE_MB", "128"))
+    # The number of requests to each route that are handled at once can be
+    # overridden in the same way, as can the budget for their total cost and
+    # the deadline for each request.
+    concurrency_limits = json.loads(os.environ.get("SUPP_AI_CONCURRENCY_LIMITS", "{}"))
+    admission = AdmissionControl(
+        {**DEFAULT_CONCURRENCY_LIMITS, **concurrency_limits},
+        int(os.environ.get("SUPP_AI_MAX_COST", DEFAULT_MAX_COST)),
+        float(os.environ.get("SUPP_AI_DEADLINE_SECONDS", DEFAULT_DEADLINE_SECONDS)),
+        checkpoint=checkpoint,
+    )
+    # Requests with an X-Cache-Bypass header that matches this token bypass
+    # the response cache, which `sonar` uses to measure the cost of each
+    # route. It's disabled unless a token is set.
+    cache_bypass_token = os.environ.get("SUPP_AI_CACHE_BYPASS_TOKEN", "").strip()
+    app.register_blueprint(
+        create_api(
+            idx,
+            cache_control,
+            response_cache_mb * 1024 * 1024,
+            admission,
+            cache_bypass_token or None,
+        ),
+        url_prefix="/",
+    )
+    return app
+
 
-    logger.debug("Starting: init API...")
-    app.register_blueprint(create_api(idx), url_prefix="/")
-    logger.debug("Complete: init API...")
+def start(data_dir: str, port: int, prod: bool, profile_path: Optional[str] = None):
+    """
+    Starts up a HTTP server attached to the provider port, and optionally
+    in development mode (which is ideal for local development but unideal
+    for production use).
+
+    The server starts right away, while the index is loaded in the
+    background. Until it's loaded the `/health/ready` route reports the
+    progress of each phase of loading it, and all other routes (except
+    `/health/live`) respond with a 503.
+
+    If a profile_path is provided, the time and memory used by each phase of
+    loading the index are measured, and written to it as JSON once the API is
+    ready, along with an estimate of the size of the index's largest
+    structures.
+    """
+
+    logging_config = {
+        "level": getattr(logging, os.environ.get("LOG_LEVEL", default="INFO"))
+    }
+
+    # If we're in production we setup a handler that writes JSON log messages
+    # in a format that Google likes.
+    if prod:
+        json_handler = logging.StreamHandler()
+        json_handler.setFormatter(StackdriverJsonFormatter())
+        logging_config["handlers"] = [json_handler]
+
+    logging.basicConfig(**logging_config)
+
+    logger = logging.getLogger(__name__)
+    logger.debug("AHOY! Let's get this boat out to water...")
+
+    static_dir = os.environ.get("SUPP_AI_STATIC_DIR", os.path.abspath("static"))
+    # Deltas (see `app/delta.py`) are applied to the index in order, which
+    # allows a new version of the data to be shipped without a full archive.
+    delta_paths = [
+        os.path.join(data_dir, delta_path)
+        for delta_path in os.environ.get("SUPPAI_DATA_DELTAS", "").split(",")
+        if delta_path.strip() != ""
+    ]
+    delta_phases = ["deltas"] if len(delta_paths) > 0 else []
+    profiler = LoadProfiler() if profile_path is not None else None
+    progress = LoadProgress(
+        LOAD_PHASES + delta_phases + ["sitemap", "api"],
+        profiler.measure if profiler is not None else None,
+    )
+    loading_app = LoadingApp(progress)
+
+    def load():
+        try:
+            logger.debug("Starting: init agent index...")
+            idx = InteractionIndex.from_data(
+                os.environ["SUPPAI_DATA_ARCHIVE"], data_dir, progress
+            )
+            logger.debug("Complete: init agent index...")
+
+            if len(delta_paths) > 0:
+                logger.debug("Starting: apply data deltas...")
+                with progress.phase("deltas"):
+                    for delta_path in delta_paths:
+                        idx = idx.apply_delta(InteractionIndex.load_delta(delta_path))
+                logger.debug(f"Complete: apply data deltas, version {idx.version}...")
+
+            # The search index is synchronized in the background, so that we
+            # don't wait on it to start serving requests. It can be disabled
+            # when the index is synchronized separately, via
+            # `python app/search.py`.
+            if os.environ.get("SUPP_AI_SEARCH_SYNC", "background") == "background":
+                search_sync = AgentIndexSync(
+                    idx.algolia_client,
+                    idx.index_name,
+                    os.environ.get("SUPP_AI_SEARCH_SYNC_STATE_DIR"),
+                )
+
+                def sync_search_index():
+                    # The sync happens at the same time as other phases, so
+                    # we don't measure the memory it allocates.
+                    measure = (
+                        profiler.measure("search_sync", trace_memory=False)
+                        if profiler is not None
+                        else nullcontext()
+                    )
+                    try:
+                        with measure:
+                            search_sync.sync(idx.get_all_agents())
+                    except Exception:
+                        logger.exception("Search index synchronization failed.")
+
+                logger.debug("Starting: search index sync in the background...")
+                Thread(target=sync_search_index, daemon=True).start()
+
+            logger.debug("Starting: generate sitemap...")
+            with progress.phase("sitemap"):
+                write_sitemaps(idx, static_dir)
+            logger.debug("Complete: generate sitemap....")
+
+            logger.debug("Starting: init API...")
+            with progress.phase("api"):
+                # The production server handles each request in a greenlet,
+                # which has to yield for other requests to be handled at the
+                # same time.
+                checkpoint = gevent.idle if prod else no_checkpoint
+                app = create_app(idx, static_dir, checkpoint)
+            logger.debug("Complete: init API...")
+
+            loading_app.serve(app)
+
+            # The profile is written once the API is ready, so that the time
+            # it takes to estimate the size of the index doesn't delay that.
+            if profiler is not None and profile_path is not None:
+                profiler.write(profile_path, idx)
+                logger.info(f"Wrote a profile of loading the API to {profile_path}")
+        except Exception as err:
+            logger.exception("Failed to load the API.")
+            # Not everything that can fail happens in a phase, so we make sure
+            # the failure is reported, which causes the process to be
+            # restarted rather than never becoming ready.
+            progress.fail(err)
+
+    # In development the server is restarted as changes are made, by a
+    # parent process that watches for changes. There's no need to load the
+    # index in that process, as it doesn't serve requests.
+    debug = not prod and os.environ.get("FLASK_ENV") == "development"
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        Thread(target=load, daemon=True).start()
 
     # In production we use a HTTP server appropriate for production.
-    if args.prod:
+    if prod:
         logger.debug("Starting: gevent.WSGIServer...")
         http_server = WSGIServer(
-            ("0.0.0.0", args.port), app, log=logger, error_log=logger
+            ("0.0.0.0", port), loading_app, log=logger, error_log=logger
         )
-        app.logger.info(f"Server listening at http://0.0.0.0:{args.port}")
+        logger.info(f"Server listening at http://0.0.0.0:{port}")
         http_server.serve_forever()
     else:
         logger.debug("Starting: Flask development server...")
-        app.run(host="0.0.0.0", port=args.port)
+        run_simple(
+            "0.0.0.0",
+            port,
+            loading_app,
+            use_reloader=debug,
+            use_debugger=debug,
+            threaded=True,
+        )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Starts your application's HTTP server."
     )
-    parser.add_argument("--port", "-p", help="The port to listen on", default=8000)
+    parser.add_argument(
+        "--port", "-p", help="The port to listen on", default=8000, type=int
+    )
     parser.add_argument(
         "--prod",
         help="If specified the server is started in production mode, where "
@@ -123,5 +284,11 @@ if __name__ == "__main__":
         + "collection of interactions.",
         default="/usr/local/data/skiff",
     )
+    parser.add_argument(
+        "--profile",
+        help="Path to write a JSON report to, with the time and memory used "
+        + "by each phase of loading the API. Profiling slows loading down.",
+        default=None,
+    )
     args = parser.parse_args()
-    start(args.data_dir, args.port, args.prod)
+    start(args.data_dir, args.port, args.prod, args.profile)
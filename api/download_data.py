@@ -1,23 +1,444 @@
 from argparse import ArgumentParser
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Thread
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from urllib import request
+from http.client import HTTPException
 from os import path
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import time
 
-def download(archive: str, dest: str) -> None:
+DEFAULT_BASE_URL = "https://storage.googleapis.com/supp-ai-data"
+
+# The archive is downloaded in chunks of this size, several at a time.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# The size of each read from the network, and from disk.
+BLOCK_SIZE = 256 * 1024
+
+# The number of times a chunk is attempted before the download fails.
+ATTEMPTS = 4
+
+
+class Remote(NamedTuple):
+    """
+    What the server tells us about the archive before we download it.
+    """
+
+    size: Optional[int]
+    accepts_ranges: bool
+    etag: Optional[str]
+    md5: Optional[str]
+
+
+def stat(url: str) -> Remote:
+    with request.urlopen(request.Request(url, method="HEAD")) as resp:
+        length = resp.headers.get("Content-Length")
+        # Google Cloud Storage sends the checksums of each object, i.e.
+        # "crc32c=n03x6A==,md5=Ojk9c3dhfxgoKVVHYwFbHQ==".
+        md5 = None
+        for value in resp.headers.get_all("x-goog-hash") or []:
+            for checksum in value.split(","):
+                name, _, digest = checksum.strip().partition("=")
+                if name == "md5":
+                    md5 = b64decode(digest).hex()
+        return Remote(
+            int(length) if length is not None else None,
+            resp.headers.get("Accept-Ranges") == "bytes",
+            resp.headers.get("ETag"),
+            md5,
+        )
+
+
+class Download:
+    """
+    Tracks the progress of a download, which is split into chunks that are
+    written to the same file concurrently.
+
+    The chunks that are complete are recorded in a state file alongside the
+    archive, so that an interrupted download can be resumed. Readers can wait
+    for the start of the file to be written, which allows the archive to be
+    extracted while it's downloaded.
+    """
+
+    def __init__(self, full_path: str, remote: Remote, chunk_size: int):
+        self.state_path = f"{full_path}.parts"
+        self.remote = remote
+        # If the server doesn't support ranged requests, or doesn't tell us
+        # how large the archive is, we download it in a single request.
+        self.ranged = remote.accepts_ranges and remote.size is not None
+        self.chunk_size = chunk_size if self.ranged else None
+        if self.ranged and remote.size is not None:
+            self.chunk_count = max(1, -(-remote.size // chunk_size))
+        else:
+            self.chunk_count = 1
+        self.written = [0] * self.chunk_count
+        self.done = [False] * self.chunk_count
+        self.prefix = 0
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.condition = Condition()
+
+        # The chunks from a previous attempt are only reused if they're for
+        # the same version of the archive, and were split up the same way.
+        state = self.load_state()
+        if self.ranged and state is not None:
+            if {**state, "done": []} == self.describe([]):
+                for idx in state["done"]:
+                    self.written[idx] = self.chunk_length(idx)
+                    self.done[idx] = True
+                self.advance()
+
+    def describe(self, done: List[int]) -> Dict:
+        return {
+            "size": self.remote.size,
+            "etag": self.remote.etag,
+            "chunk_size": self.chunk_size,
+            "done": done,
+        }
+
+    def load_state(self) -> Optional[Dict]:
+        if not path.exists(self.state_path):
+            return None
+        with open(self.state_path) as fp:
+            return json.load(fp)
+
+    def save_state(self) -> None:
+        # The state is written to a temporary file first, so that it's never
+        # left partially written.
+        done = [idx for idx in range(self.chunk_count) if self.done[idx]]
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(self.describe(done), fp)
+        os.replace(tmp_path, self.state_path)
+
+    def remove_state(self) -> None:
+        if path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def chunk_range(self, idx: int) -> Tuple[int, Optional[int]]:
+        """
+        Returns the offset of the first byte of the chunk, and the offset just
+        after its last byte (or None if it isn't known).
+        """
+        if self.chunk_size is None or self.remote.size is None:
+            return 0, self.remote.size
+        start = idx * self.chunk_size
+        return start, min(start + self.chunk_size, self.remote.size)
+
+    def chunk_length(self, idx: int) -> int:
+        start, end = self.chunk_range(idx)
+        if end is None:
+            raise RuntimeError("The length of the archive isn't known.")
+        return end - start
+
+    def pending(self) -> List[int]:
+        return [idx for idx in range(self.chunk_count) if not self.done[idx]]
+
+    def advance(self) -> None:
+        """
+        Updates the number of bytes at the start of the file that have been
+        written, without any gaps.
+        """
+        prefix = 0
+        for idx in range(self.chunk_count):
+            prefix += self.written[idx]
+            if not self.done[idx]:
+                break
+        self.prefix = prefix
+
+    def record(self, idx: int, length: int) -> None:
+        with self.condition:
+            self.written[idx] += length
+            self.advance()
+            self.condition.notify_all()
+
+    def complete(self, idx: int) -> None:
+        with self.condition:
+            self.done[idx] = True
+            self.advance()
+            self.save_state()
+            self.condition.notify_all()
+
+    def finish(self) -> None:
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def fail(self, error: BaseException) -> None:
+        with self.condition:
+            self.error = error
+            self.condition.notify_all()
+
+    def wait_for(self, offset: int) -> int:
+        """
+        Waits until the byte at the provided offset is written, or the download
+        ends, and returns the number of bytes at the start of the file that can
+        be read.
+        """
+        with self.condition:
+            while self.prefix <= offset and not self.finished:
+                if self.error is not None:
+                    raise RuntimeError("The download failed.") from self.error
+                self.condition.wait()
+            return self.prefix
+
+
+class PrefixReader:
+    """
+    A file-like object that reads the archive from the start as it's
+    downloaded, and computes its checksums along the way.
+    """
+
+    def __init__(self, download: Download, fd: int, hashes: Dict):
+        self.download = download
+        self.fd = fd
+        self.hashes = hashes
+        self.offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        available = self.download.wait_for(self.offset)
+        if size < 0:
+            size = available - self.offset
+        size = min(size, available - self.offset)
+        if size <= 0:
+            return b""
+        data = os.pread(self.fd, size, self.offset)
+        self.offset += len(data)
+        for digest in self.hashes.values():
+            digest.update(data)
+        return data
+
+    def drain(self) -> None:
+        while len(self.read(BLOCK_SIZE)) > 0:
+            pass
+
+
+def fetch(url: str, download: Download, fd: int, idx: int) -> None:
+    """
+    Downloads a single chunk of the archive. If a request fails it's retried,
+    starting from where the previous attempt left off. The chunk only fails
+    once several attempts in a row don't make any progress.
+    """
+    attempt = 0
+    while True:
+        start, end = download.chunk_range(idx)
+        offset = start + download.written[idx]
+        resumed_from = offset
+        headers = {}
+        if download.ranged and end is not None:
+            headers["Range"] = f"bytes={offset}-{end - 1}"
+        try:
+            with request.urlopen(request.Request(url, headers=headers)) as resp:
+                if download.ranged and resp.status != 206:
+                    raise RuntimeError(
+                        f"Expected a partial response, got {resp.status}"
+                    )
+                # Without ranges we start over, and skip what we already have.
+                skip = offset - start if not download.ranged else 0
+                while True:
+                    block = resp.read(BLOCK_SIZE)
+                    if len(block) == 0:
+                        break
+                    if skip > 0:
+                        skipped = block[:skip]
+                        block = block[skip:]
+                        skip -= len(skipped)
+                        if len(block) == 0:
+                            continue
+                    os.pwrite(fd, block, offset)
+                    offset += len(block)
+                    download.record(idx, len(block))
+            if end is not None and offset != end:
+                raise IOError(f"Chunk {idx} ended after {offset - start} bytes")
+            download.complete(idx)
+            return
+        except (IOError, RuntimeError, HTTPException) as err:
+            attempt = 0 if offset > resumed_from else attempt + 1
+            if attempt == ATTEMPTS:
+                raise
+            print(f"⚠️  chunk {idx} failed, retrying: {err}")
+            time.sleep(2**attempt)
+
+
+def extract(reader: PrefixReader, staging_dir: str) -> None:
+    """
+    Extracts the archive as it's read, to the provided directory.
+    """
+    root = path.realpath(staging_dir)
+    with tarfile.open(fileobj=reader, mode="r|*") as tar:
+        for member in tar:
+            target = path.realpath(path.join(root, member.name))
+            if target != root and not target.startswith(root + os.sep):
+                raise RuntimeError(f"Refusing to extract {member.name}")
+            if member.issym() or member.islnk():
+                raise RuntimeError(f"Refusing to extract link {member.name}")
+            tar.extract(member, root)
+
+
+def verify(hashes: Dict, expected: Dict[str, Optional[str]]) -> None:
+    for name, digest in hashes.items():
+        actual = digest.hexdigest()
+        if actual != expected[name]:
+            raise RuntimeError(
+                f"The {name} checksum doesn't match, expected {expected[name]} "
+                + f"but got {actual}"
+            )
+    if len(hashes) == 0:
+        print("⚠️  no checksum is available, the archive wasn't verified")
+
+
+def download(
+    archive: str,
+    dest: str,
+    base_url: str = DEFAULT_BASE_URL,
+    workers: int = 8,
+    chunk_size: int = CHUNK_SIZE,
+    sha256: Optional[str] = None,
+    extract_archive: bool = False,
+) -> None:
+    """
+    Downloads the archive to the provided directory. The archive is fetched
+    in chunks, several at a time, and an interrupted download is resumed where
+    it left off. Its checksum is verified against the provided sha256 and the
+    md5 reported by the server, if either is available.
+
+    If extract_archive is set, the archive is extracted as it's downloaded,
+    to a staging directory. Its contents are moved into the destination (and
+    the archive is removed) once the checksum is verified.
+    """
+    url = f"{base_url.rstrip('/')}/{archive}"
     full_path = path.join(dest, archive)
-    request.urlretrieve(
-        f"https://storage.googleapis.com/supp-ai-data/{archive}",
-        full_path
-    )
+    remote = stat(url)
+    progress = Download(full_path, remote, chunk_size)
+
+    hashes = {}
+    expected = {"sha256": sha256, "md5": remote.md5}
+    for name, checksum in expected.items():
+        if checksum is not None:
+            hashes[name] = hashlib.new(name)
+
+    fd = os.open(full_path, os.O_RDWR | os.O_CREAT)
+    try:
+        if remote.size is not None and os.fstat(fd).st_size != remote.size:
+            os.ftruncate(fd, remote.size)
+        reader = PrefixReader(progress, fd, hashes)
+
+        staging_dir = path.join(dest, f".{archive}.staging")
+        extract_errors: List[BaseException] = []
+        extractor = None
+        if extract_archive:
+            if path.exists(staging_dir):
+                shutil.rmtree(staging_dir)
+            os.makedirs(staging_dir)
+
+            def extract_in_background():
+                try:
+                    extract(reader, staging_dir)
+                except BaseException as err:
+                    extract_errors.append(err)
+
+            extractor = Thread(target=extract_in_background, daemon=True)
+            extractor.start()
+
+        pending = progress.pending()
+        print(f"⬇️  downloading {len(pending)} of {progress.chunk_count} chunks")
+        with ThreadPoolExecutor(workers) as pool:
+            futures = [pool.submit(fetch, url, progress, fd, idx) for idx in pending]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException as err:
+                for future in futures:
+                    future.cancel()
+                progress.fail(err)
+                raise
+        progress.finish()
+
+        if extractor is not None:
+            extractor.join()
+            if len(extract_errors) > 0:
+                raise extract_errors[0]
+        reader.drain()
+        try:
+            verify(hashes, expected)
+        except RuntimeError:
+            # There's no way to tell which chunk is corrupt, so we start over
+            # next time.
+            progress.remove_state()
+            os.remove(full_path)
+            if extract_archive:
+                shutil.rmtree(staging_dir)
+            raise
+    finally:
+        os.close(fd)
+
+    progress.remove_state()
     print(f"✨ downloaded {full_path}")
 
+    if extract_archive:
+        for name in os.listdir(staging_dir):
+            target = path.join(dest, name)
+            if path.isdir(target) and not path.islink(target):
+                shutil.rmtree(target)
+            os.replace(path.join(staging_dir, name), target)
+        os.rmdir(staging_dir)
+        os.remove(full_path)
+        print(f"✨ extracted {full_path} to {dest}")
+
 
 if __name__ == "__main__":
     parser = ArgumentParser()
-    parser.add_argument("--archive", "-a",
-        help="The name of the data archive to download", required=True)
-    parser.add_argument("--dest", "-d",
-        help="Path to where the archive should be written.")
+    parser.add_argument(
+        "--archive",
+        "-a",
+        help="The name of the data archive to download",
+        required=True,
+    )
+    parser.add_argument(
+        "--dest", "-d", help="Path to where the archive should be written.", default="."
+    )
+    parser.add_argument(
+        "--base-url",
+        help="The URL the archive is downloaded from, i.e. a local server "
+        + "when testing.",
+        default=DEFAULT_BASE_URL,
+    )
+    parser.add_argument(
+        "--workers",
+        help="The number of chunks downloaded at once.",
+        default=8,
+        type=int,
+    )
+    parser.add_argument(
+        "--chunk-size",
+        help="The size of each chunk, in bytes.",
+        default=CHUNK_SIZE,
+        type=int,
+    )
+    parser.add_argument(
+        "--sha256", help="The expected SHA-256 checksum of the archive.", default=None
+    )
+    parser.add_argument(
+        "--extract",
+        help="Extract the archive while it's downloaded, and remove it afterwards.",
+        action="store_true",
+        default=False,
+    )
 
     args = parser.parse_args()
 
-    download(args.archive, args.dest)
+    download(
+        args.archive,
+        args.dest,
+        args.base_url,
+        args.workers,
+        args.chunk_size,
+        args.sha256,
+        args.extract,
+    )
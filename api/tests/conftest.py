@@ -0,0 +1,37 @@
+import pytest
+from os import path
+from flask import Flask
+from flask.testing import FlaskClient
+from app import data
+from app.api import create_api
+from app.data import InteractionIndex
+from fakes import FakeSearchClient
+
+# A small collection of interactions, see `tests/data`.
+DATA_DIR = path.join(path.dirname(__file__), "data")
+DATA_ARCHIVE = "20211020_01.tar.gz"
+
+
+@pytest.fixture
+def search_client(monkeypatch) -> FakeSearchClient:
+    client = FakeSearchClient()
+    monkeypatch.setenv("SUPP_AI_ALGOLIA_API_KEY", "test")
+    monkeypatch.setattr(
+        data.SearchClient, "create", staticmethod(lambda *args, **kwargs: client)
+    )
+    return client
+
+
+@pytest.fixture
+def idx(search_client: FakeSearchClient) -> InteractionIndex:
+    return InteractionIndex.from_data(DATA_ARCHIVE, DATA_DIR)
+
+
+def api_client(idx: InteractionIndex, **kwargs) -> FlaskClient:
+    """
+    Returns a client for the API for the provided index. The keyword arguments
+    are passed to `create_api`.
+    """
+    app = Flask(__name__)
+    app.register_blueprint(create_api(idx, **kwargs), url_prefix="/")
+    return app.test_client()
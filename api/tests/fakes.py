@@ -0,0 +1,182 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from base64 import b64encode
+import hashlib
+
+
+class FakeSearchIndex:
+    """
+    A stand-in for an Algolia index, which keeps its records in memory. Each
+    call that modifies the index is recorded in `calls`, so that tests can
+    check what was sent.
+    """
+
+    def __init__(self, name: str, client: "FakeSearchClient"):
+        self.name = name
+        self.client = client
+        self.records: Dict[str, Dict] = {}
+        self.settings: Dict = {}
+        self.calls: List = []
+
+    def save_objects(self, objects: List[Dict]) -> None:
+        self.calls.append(("save_objects", [obj["objectID"] for obj in objects]))
+        self.client.created.add(self.name)
+        for obj in objects:
+            self.records[obj["objectID"]] = deepcopy(obj)
+
+    def delete_objects(self, object_ids: List[str]) -> None:
+        self.calls.append(("delete_objects", list(object_ids)))
+        for object_id in object_ids:
+            self.records.pop(object_id, None)
+
+    def browse_objects(self, request_options: Optional[Dict] = None) -> Iterator[Dict]:
+        # Algolia includes attributes that start with an underscore, like the
+        # highlighted values, which aren't part of the record.
+        for record in list(self.records.values()):
+            yield {**deepcopy(record), "_highlightResult": {}}
+
+    def get_settings(self) -> Dict:
+        return deepcopy(self.settings)
+
+    def set_settings(self, settings: Dict) -> None:
+        self.calls.append(("set_settings", deepcopy(settings)))
+        self.client.created.add(self.name)
+        self.settings = {**self.settings, **deepcopy(settings)}
+
+    def search(self, query: str, params: Dict) -> Dict:
+        """
+        Returns the records with a preferred name that starts with the query,
+        in the format Algolia uses.
+        """
+        per_page = int(params.get("hitsPerPage", 20))
+        page = int(params.get("page", 0))
+        matches = sorted(
+            (
+                record
+                for record in self.records.values()
+                if record["preferred_name"].lower().startswith(query.lower())
+            ),
+            key=lambda record: record["objectID"],
+        )
+        hits = []
+        for record in matches[page * per_page : (page + 1) * per_page]:
+            highlights = {
+                "preferred_name": {
+                    "value": record["preferred_name"],
+                    "matchLevel": "full" if query != "" else "none",
+                },
+                "synonyms": [
+                    {"value": synonym, "matchLevel": "none"}
+                    for synonym in record["synonyms"]
+                ],
+            }
+            hits.append({**deepcopy(record), "_highlightResult": highlights})
+        return {
+            "hits": hits,
+            "nbHits": len(matches),
+            "nbPages": (len(matches) + per_page - 1) // per_page,
+            "query": query,
+            "page": page,
+            "hitsPerPage": per_page,
+        }
+
+
+class FakeSearchClient:
+    """
+    A stand-in for an Algolia `SearchClient`. Like Algolia, an index only
+    exists once something is written to it.
+    """
+
+    def __init__(self):
+        self.indices: Dict[str, FakeSearchIndex] = {}
+        self.created = set()
+
+    def list_indices(self) -> Dict:
+        return {"items": [{"name": name} for name in sorted(self.created)]}
+
+    def init_index(self, name: str) -> FakeSearchIndex:
+        if name not in self.indices:
+            self.indices[name] = FakeSearchIndex(name, self)
+        return self.indices[name]
+
+
+class FakeFileServer:
+    """
+    A stand-in for Google Cloud Storage, which serves the provided files from
+    localhost. It supports ranged requests unless `ranged` is False. Each
+    GET request is recorded in `requests`, as the path and its Range header.
+    """
+
+    def __init__(self, files: Dict[str, bytes], ranged: bool = True):
+        self.files = files
+        self.ranged = ranged
+        self.requests: List[Tuple[str, Optional[str]]] = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "FakeFileServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def send_headers(self, body: bytes, status: int, headers: Dict) -> None:
+                self.send_response(status)
+                md5 = b64encode(hashlib.md5(body).digest()).decode("ascii")
+                self.send_header("x-goog-hash", f"crc32c=AAAAAA==,md5={md5}")
+                self.send_header("ETag", '"v1"')
+                if fake.ranged:
+                    self.send_header("Accept-Ranges", "bytes")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def file(self) -> Optional[bytes]:
+                body = fake.files.get(self.path.lstrip("/"))
+                if body is None:
+                    self.send_error(404)
+                return body
+
+            def do_HEAD(self) -> None:
+                body = self.file()
+                if body is not None:
+                    self.send_headers(body, 200, {"Content-Length": str(len(body))})
+
+            def do_GET(self) -> None:
+                body = self.file()
+                if body is None:
+                    return
+                range_header = self.headers.get("Range")
+                fake.requests.append((self.path, range_header))
+                if not fake.ranged or range_header is None:
+                    self.send_headers(body, 200, {"Content-Length": str(len(body))})
+                    self.wfile.write(body)
+                    return
+                first, _, last = range_header[len("bytes=") :].partition("-")
+                start, end = int(first), int(last) + 1
+                self.send_headers(
+                    body,
+                    206,
+                    {
+                        "Content-Length": str(end - start),
+                        "Content-Range": f"bytes {start}-{end - 1}/{len(body)}",
+                    },
+                )
+                self.wfile.write(body[start:end])
+
+        return Handler
@@ -0,0 +1,141 @@
+import gevent  # type: ignore
+import json
+from gevent.pywsgi import WSGIServer  # type: ignore
+from http.client import HTTPConnection
+from threading import Thread
+from time import perf_counter
+from typing import Dict, List
+from app.admission import AdmissionControl, DEFAULT_CONCURRENCY_LIMITS
+from app.admission import DEFAULT_MAX_COST
+from app.data import InteractionIndex
+from app.start import create_app
+from conftest import DATA_DIR, api_client
+
+
+def busy(seconds: float) -> None:
+    """
+    Keeps the CPU busy without yielding, like the routes do.
+    """
+    until = perf_counter() + seconds
+    while perf_counter() < until:
+        pass
+
+
+def test_requests_are_shed_by_the_production_server(idx: InteractionIndex, monkeypatch):
+    get_interacting_agent = idx.get_interacting_agent
+
+    def slow_interacting_agent(*args, **kwargs):
+        busy(0.02)
+        return get_interacting_agent(*args, **kwargs)
+
+    monkeypatch.setattr(idx, "get_interacting_agent", slow_interacting_agent)
+    monkeypatch.setenv("SUPP_AI_CONCURRENCY_LIMITS", '{"get_agent_interactions": 1}')
+    monkeypatch.setenv("SUPP_AI_CACHE_BYPASS_TOKEN", "secret")
+    server = WSGIServer(
+        ("127.0.0.1", 0), create_app(idx, DATA_DIR, gevent.idle), log=None
+    )
+    server.start()
+
+    statuses: Dict[str, List[int]] = {"interactions": [], "agent": []}
+
+    def get(route: str, url: str):
+        conn = HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+        # Requests that bypass the response cache are always handled.
+        conn.request("GET", url, headers={"X-Cache-Bypass": "secret"})
+        statuses[route].append(conn.getresponse().status)
+        conn.close()
+
+    # The requests are made from threads, while the server handles them in
+    # greenlets in this one, like it does in production.
+    clients = [
+        Thread(target=get, args=("interactions", "/agent/C0004057/interactions"))
+        for _ in range(10)
+    ] + [Thread(target=get, args=("agent", "/agent/C0004057")) for _ in range(5)]
+    for client in clients:
+        client.start()
+    while any(client.is_alive() for client in clients):
+        gevent.sleep(0.01)
+    server.stop()
+
+    assert len(statuses["interactions"]) == 10
+    assert 200 in statuses["interactions"]
+    assert 503 in statuses["interactions"]
+    assert set(statuses["interactions"]) == {200, 503}
+    # Cheap routes aren't limited.
+    assert statuses["agent"] == [200] * 5
+
+
+def test_exports_let_other_requests_be_handled(idx: InteractionIndex, monkeypatch):
+    get_evidence = idx.get_evidence
+    started = []
+
+    def slow_evidence(*args, **kwargs):
+        started.append(True)
+        busy(0.1)
+        return get_evidence(*args, **kwargs)
+
+    monkeypatch.setattr(idx, "get_evidence", slow_evidence)
+    server = WSGIServer(
+        ("127.0.0.1", 0), create_app(idx, DATA_DIR, gevent.idle), log=None
+    )
+    server.start()
+
+    finished: Dict[str, List[float]] = {"export": [], "agent": [], "meta": []}
+    bodies: List[bytes] = []
+
+    def get(route: str, url: str):
+        conn = HTTPConnection("127.0.0.1", server.server_port, timeout=30)
+        conn.request("GET", url)
+        resp = conn.getresponse()
+        assert resp.status == 200
+        body = resp.read()
+        finished[route].append(perf_counter())
+        if route == "export":
+            bodies.append(body)
+        conn.close()
+
+    # The export is produced after its route returns, so the other requests
+    # are only made once it's underway.
+    exporter = Thread(target=get, args=("export", "/export?limit=1000"))
+    exporter.start()
+    while len(started) == 0:
+        gevent.sleep(0.01)
+    clients = [Thread(target=get, args=("agent", "/agent/C0004057"))] + [
+        Thread(target=get, args=("meta", "/meta"))
+    ]
+    for client in clients:
+        client.start()
+    while any(client.is_alive() for client in clients + [exporter]):
+        gevent.sleep(0.01)
+    server.stop()
+
+    [export_finished] = finished["export"]
+    assert finished["agent"][0] < export_finished
+    assert finished["meta"][0] < export_finished
+    [body] = bodies
+    last = json.loads(body.decode("utf-8").splitlines()[-1])
+    assert last == {"type": "page", "agents": 6, "next_cursor": None}
+
+
+def test_exports_end_when_the_deadline_passes(idx: InteractionIndex, monkeypatch):
+    get_evidence = idx.get_evidence
+
+    def slow_evidence(*args, **kwargs):
+        busy(0.1)
+        return get_evidence(*args, **kwargs)
+
+    monkeypatch.setattr(idx, "get_evidence", slow_evidence)
+    admission = AdmissionControl(DEFAULT_CONCURRENCY_LIMITS, DEFAULT_MAX_COST, 0.25)
+    resp = api_client(idx, admission=admission).get("/export?limit=1000")
+    assert resp.status_code == 200
+    records = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    # The first agent has 3 interactions, which takes longer than the deadline,
+    # so the page ends after it, and can be resumed from there.
+    assert [record["type"] for record in records] == ["agent"] + ["interaction"] * 3 + [
+        "page"
+    ]
+    assert records[-1] == {"type": "page", "agents": 1, "next_cursor": "C0004057"}
+    # Capacity is released once the stream is closed.
+    assert admission.in_progress["export"] == 1
+    resp.close()
+    assert admission.in_progress["export"] == 0
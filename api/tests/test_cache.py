@@ -0,0 +1,120 @@
+from app.data import InteractionIndex
+from app.search import AgentIndexSync
+from conftest import api_client
+from fakes import FakeSearchClient
+
+
+def test_search_results_are_not_cached(
+    idx: InteractionIndex, search_client: FakeSearchClient
+):
+    client = api_client(idx)
+
+    # Until the search index is populated there aren't any results, which
+    # shouldn't be cached by anyone.
+    resp = client.get("/agent/search?q=vit")
+    assert resp.status_code == 200
+    assert resp.get_json()["total_results"] == 0
+    assert "ETag" not in resp.headers
+    assert "Cache-Control" not in resp.headers
+    assert "ETag" not in client.get("/agent/suggest?q=vit").headers
+
+    AgentIndexSync(search_client, idx.index_name).sync(idx.get_all_agents())
+
+    resp = client.get("/agent/search?q=vit")
+    assert [agent["cui"] for agent in resp.get_json()["results"]] == ["C0042890"]
+    resp = client.get("/agent/suggest?q=vit")
+    assert [agent["cui"] for agent in resp.get_json()["results"]] == ["C0042890"]
+
+
+def test_etags_include_the_revision(idx: InteractionIndex, monkeypatch):
+    monkeypatch.setenv("SUPP_AI_REVISION", "0123456789abcdef")
+    client = api_client(idx)
+    resp = client.get("/agent/C0042890")
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] == '"20211020_01-0123456789ab"'
+    assert resp.headers["Cache-Control"] == "public, max-age=3600"
+
+    resp = client.get(
+        "/agent/C0042890", headers={"If-None-Match": resp.headers["ETag"]}
+    )
+    assert resp.status_code == 304
+    assert resp.get_data() == b""
+
+    # After the code changes, clients get the new response.
+    monkeypatch.setenv("SUPP_AI_REVISION", "fedcba9876543210")
+    resp = api_client(idx).get(
+        "/agent/C0042890", headers={"If-None-Match": '"20211020_01-0123456789ab"'}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] == '"20211020_01-fedcba987654"'
+
+
+def test_not_modified_responses_arent_computed(idx: InteractionIndex, monkeypatch):
+    monkeypatch.setenv("SUPP_AI_REVISION", "0123456789abcdef")
+    calls = []
+    get_agent = idx.get_agent_with_interaction_count
+
+    def counted(cui: str):
+        calls.append(cui)
+        return get_agent(cui)
+
+    monkeypatch.setattr(idx, "get_agent_with_interaction_count", counted)
+    # A new client has an empty cache, like after a restart or on another
+    # replica.
+    for headers in [
+        {"If-None-Match": '"20211020_01-0123456789ab"'},
+        # The compressed variants have their own ETag.
+        {"If-None-Match": '"20211020_01-0123456789ab-gzip"'},
+    ]:
+        resp = api_client(idx).get("/agent/C0042890", headers=headers)
+        assert resp.status_code == 304
+    assert calls == []
+
+
+def test_failures_arent_modified_for_other_etags(idx: InteractionIndex, monkeypatch):
+    monkeypatch.setenv("SUPP_AI_REVISION", "0123456789abcdef")
+    client = api_client(idx)
+    # Tags for another version of the data or of the code.
+    for etag in ['"20211019_01-0123456789ab"', '"20211020_01-fedcba987654"', "nope"]:
+        headers = {"If-None-Match": etag}
+        assert client.get("/agent/NOPE", headers=headers).status_code == 404
+        resp = client.get("/agent/C0042890/interactions?p=x", headers=headers)
+        assert resp.status_code == 400
+        assert "ETag" not in resp.headers
+
+
+def test_only_requests_with_the_token_bypass_the_cache(
+    idx: InteractionIndex, monkeypatch
+):
+    calls = []
+    get_agent = idx.get_agent_with_interaction_count
+
+    def counted(cui: str):
+        calls.append(cui)
+        return get_agent(cui)
+
+    monkeypatch.setattr(idx, "get_agent_with_interaction_count", counted)
+    first = api_client(idx).get("/agent/C0042890")
+    assert len(calls) == 1
+
+    client = api_client(idx, cache_bypass_token="secret")
+    assert client.get("/agent/C0042890").get_data() == first.get_data()
+    assert len(calls) == 2
+    # Browsers send this when the page is reloaded.
+    client.get("/agent/C0042890", headers={"Cache-Control": "no-cache"})
+    client.get("/agent/C0042890", headers={"X-Cache-Bypass": "guess"})
+    assert len(calls) == 2
+
+    resp = client.get("/agent/C0042890", headers={"X-Cache-Bypass": "secret"})
+    assert resp.status_code == 200
+    assert resp.get_data() == first.get_data()
+    assert len(calls) == 3
+    # The response that was computed isn't stored, so nothing else changes.
+    client.get("/agent/C0042890")
+    assert len(calls) == 3
+
+    # Without a token nothing bypasses the cache.
+    client = api_client(idx)
+    client.get("/agent/C0042890")
+    client.get("/agent/C0042890", headers={"X-Cache-Bypass": ""})
+    assert len(calls) == 4
@@ -0,0 +1,75 @@
+from typing import Dict, List
+from re import split
+from app.data import InteractionIndex, InteractionId, SupportingSentence, MAX_WORDS
+
+
+def sentences_by_uid(idx: InteractionIndex) -> Dict[int, SupportingSentence]:
+    return {
+        sentence.uid: sentence
+        for sentences in idx.sentences_by_interaction_id.values()
+        for sentence in sentences
+    }
+
+
+def words(sentence: SupportingSentence) -> List[str]:
+    text = "".join(span.text for span in sentence.spans)
+    return [token for token in split(r"\W+", text) if token != ""]
+
+
+def test_long_sentences_are_truncated(idx: InteractionIndex):
+    sentence = sentences_by_uid(idx)[6]
+    assert len(words(sentence)) <= MAX_WORDS
+    assert [span.cui for span in sentence.spans if span.cui is not None] == [
+        "C0004057",
+        "C0936169",
+    ]
+    assert [span.text for span in sentence.spans if span.cui is not None] == [
+        "aspirin",
+        "Échinacée",
+    ]
+
+
+def test_sentences_share_text(idx: InteractionIndex):
+    # The sentence mentions three agents, so it's evidence of three
+    # interactions. The text after the last mention is the same for two of
+    # them.
+    by_uid = sentences_by_uid(idx)
+    assert by_uid[2].spans[-1].text == " were given together."
+    assert by_uid[2].spans[-1].text is by_uid[3].spans[-1].text
+
+
+def test_sentences_added_by_a_delta_share_text(idx: InteractionIndex):
+    interaction_id = InteractionId.from_str("C0004057-C0043031")
+    existing = idx.sentences_by_interaction_id[interaction_id]
+    sentence = "Aspirin and warfarin were given together."
+    delta = {
+        "from_version": idx.version,
+        "to_version": "20211021_01",
+        "agents": {"remove": [], "upsert": {}},
+        "sentences": {
+            "remove": [],
+            "upsert": {
+                str(interaction_id): {
+                    "upsert": [
+                        {
+                            "uid": 11,
+                            "confidence": None,
+                            "paper_id": "p2",
+                            "sentence_id": 4,
+                            "sentence": sentence,
+                            "arg1": {"id": "C0004057", "span": [0, 7]},
+                            "arg2": {"id": "C0043031", "span": [12, 20]},
+                        }
+                    ],
+                    "uids": [sentence.uid for sentence in existing] + [11],
+                }
+            },
+        },
+        "interaction_ids": {"remove": [], "upsert": {}},
+        "papers": {"remove": [], "upsert": {}},
+        "meta": None,
+    }
+    updated = idx.apply_delta(delta)
+    by_uid = sentences_by_uid(updated)
+    assert by_uid[2] is sentences_by_uid(idx)[2]
+    assert by_uid[11].spans[-1].text is by_uid[2].spans[-1].text
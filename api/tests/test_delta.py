@@ -0,0 +1,142 @@
+import json
+import pytest
+import shutil
+from os import path
+from typing import Any, Dict
+from app.data import InteractionIndex, INTERACTION_SORTS
+from app.delta import create_delta
+from conftest import DATA_DIR
+from fakes import FakeSearchClient
+
+NEW_ARCHIVE = "20211021_01.tar.gz"
+
+
+def read(data_dir: str, name: str) -> Any:
+    with open(path.join(data_dir, name)) as fp:
+        return json.load(fp)
+
+
+def write(data_dir: str, name: str, value: Any) -> None:
+    with open(path.join(data_dir, name), "w") as fp:
+        json.dump(value, fp)
+
+
+def sentence(uid: int, paper_id: str, cuis: Dict[str, str]) -> Dict:
+    [(first, first_name), (second, second_name)] = cuis.items()
+    text = f"{first_name} was given with {second_name}."
+    second_start = len(first_name) + len(" was given with ")
+    return {
+        "uid": uid,
+        "confidence": None,
+        "paper_id": paper_id,
+        "sentence_id": uid,
+        "sentence": text,
+        "arg1": {"id": first, "span": [0, len(first_name)]},
+        "arg2": {"id": second, "span": [second_start, second_start + len(second_name)]},
+    }
+
+
+def new_version(data_dir: str) -> None:
+    """
+    Changes the fixture's data, adding, modifying and removing one of each
+    kind of record.
+    """
+    agents = read(data_dir, "cui_metadata.json")
+    agents["C0043481"]["definition"] = "An essential mineral."
+    agents["C0006644"] = {
+        "preferred_name": "Caffeine",
+        "synonyms": [],
+        "tradenames": [],
+        "definition": "A stimulant.",
+        "ent_type": "supplement",
+    }
+    del agents["C0017725"]
+    write(data_dir, "cui_metadata.json", agents)
+
+    sentences = read(data_dir, "sentence_dict.json")
+    [changed] = [s for s in sentences["C0042890-C0043481"] if s["uid"] == 4]
+    changed["confidence"] = 3
+    sentences["C0004057-C0936169"] = [
+        s for s in sentences["C0004057-C0936169"] if s["uid"] != 7
+    ] + [sentence(11, "p5", {"C0004057": "Aspirin", "C0936169": "echinacea"})]
+    # A whole interaction is removed, and another is added.
+    del sentences["C0043031-C0043481"]
+    sentences["C0006644-C0042890"] = [
+        sentence(12, "p5", {"C0006644": "Caffeine", "C0042890": "vitamin D"})
+    ]
+    write(data_dir, "sentence_dict.json", sentences)
+
+    interaction_ids = read(data_dir, "interaction_id_dict.json")
+    interaction_ids["C0042890"].append("C0006644-C0042890")
+    interaction_ids["C0006644"] = ["C0006644-C0042890"]
+    interaction_ids["C0043031"].remove("C0043031-C0043481")
+    interaction_ids["C0043481"].remove("C0043031-C0043481")
+    write(data_dir, "interaction_id_dict.json", interaction_ids)
+
+    papers = read(data_dir, "paper_metadata.json")
+    papers["p2"]["retraction"] = True
+    papers["p5"] = {**papers["p1"], "title": "Caffeine and vitamin D", "year": 2021}
+    # Its sentences were all removed.
+    del papers["p3"]
+    write(data_dir, "paper_metadata.json", papers)
+
+    write(data_dir, "meta.json", {"last_updated_on": "2021-10-21T12:00:00Z"})
+
+
+def test_deltas_produce_the_new_index(
+    idx: InteractionIndex, search_client: FakeSearchClient, tmpdir
+):
+    new_dir = str(tmpdir.join("new"))
+    shutil.copytree(DATA_DIR, new_dir)
+    new_version(new_dir)
+    delta = create_delta(DATA_DIR, new_dir, "20211020_01", "20211021_01")
+    assert delta["agents"]["remove"] == ["C0017725"]
+    assert sorted(delta["agents"]["upsert"]) == ["C0006644", "C0043481"]
+    assert delta["sentences"]["remove"] == ["C0043031-C0043481"]
+    assert sorted(delta["sentences"]["upsert"]) == [
+        "C0004057-C0936169",
+        "C0006644-C0042890",
+        "C0042890-C0043481",
+    ]
+    assert delta["papers"]["remove"] == ["p3"]
+    assert sorted(delta["papers"]["upsert"]) == ["p2", "p5"]
+    # Deltas are written to disk, and loaded when the API starts.
+    delta_path = str(tmpdir.join("delta.json"))
+    with open(delta_path, "w") as fp:
+        json.dump(delta, fp)
+
+    expected = InteractionIndex.from_data(NEW_ARCHIVE, new_dir)
+    actual = idx.apply_delta(InteractionIndex.load_delta(delta_path))
+
+    ignored = {"algolia_client", "index", "graph"}
+    assert vars(actual).keys() == vars(expected).keys()
+    for name, value in vars(expected).items():
+        if name not in ignored:
+            assert vars(actual)[name] == value, name
+    assert actual.version == "20211021_01"
+    assert "C0017725" not in actual.agents_by_cui
+    assert "p3" not in actual.paper_metadata_by_id
+
+    for agent in expected.get_all_agents():
+        for sort in INTERACTION_SORTS:
+            assert actual.get_interactions(agent, sort=sort) == (
+                expected.get_interactions(agent, sort=sort)
+            )
+        assert actual.get_two_hop_neighbors(agent) == (
+            expected.get_two_hop_neighbors(agent)
+        )
+        assert actual.get_top_neighbors(agent, 10) == expected.get_top_neighbors(
+            agent, 10
+        )
+    # The index the delta was applied to isn't modified.
+    assert idx.get_agent("C0017725") is not None
+    assert idx.index_meta.data_updated_on == "2021-10-20T12:00:00Z"
+
+
+def test_deltas_for_another_version_are_rejected(idx: InteractionIndex, tmpdir):
+    new_dir = str(tmpdir.join("new"))
+    shutil.copytree(DATA_DIR, new_dir)
+    new_version(new_dir)
+    delta = create_delta(DATA_DIR, new_dir, "20211019_01", "20211021_01")
+    with pytest.raises(RuntimeError, match="Delta is for version 20211019_01"):
+        idx.apply_delta(delta)
@@ -0,0 +1,122 @@
+import hashlib
+import io
+import json
+import os
+import pytest
+import random
+import tarfile
+from os import path
+from typing import Dict
+from download_data import download
+from fakes import FakeFileServer
+
+ARCHIVE = "20211020_01.tar.gz"
+CHUNK_SIZE = 64 * 1024
+
+
+def archive(files: Dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def files() -> Dict[str, bytes]:
+    # Random bytes don't compress, so the archive is split into several
+    # chunks.
+    rng = random.Random(0)
+    return {
+        "cui_metadata.json": bytes(rng.getrandbits(8) for _ in range(200 * 1024)),
+        "sentence_dict.json": bytes(rng.getrandbits(8) for _ in range(100 * 1024)),
+        "meta.json": b'{"version": "20211020_01"}',
+    }
+
+
+def sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_chunks_are_downloaded_and_extracted(files: Dict[str, bytes], tmpdir):
+    body = archive(files)
+    with FakeFileServer({ARCHIVE: body}) as server:
+        download(
+            ARCHIVE,
+            str(tmpdir),
+            server.url,
+            workers=4,
+            chunk_size=CHUNK_SIZE,
+            sha256=sha256(body),
+            extract_archive=True,
+        )
+    chunk_count = -(-len(body) // CHUNK_SIZE)
+    assert chunk_count > 2
+    assert sorted(server.requests) == sorted(
+        (
+            f"/{ARCHIVE}",
+            f"bytes={start}-{min(start + CHUNK_SIZE, len(body)) - 1}",
+        )
+        for start in range(0, len(body), CHUNK_SIZE)
+    )
+    # The archive is removed once it's extracted, along with the state file
+    # and the staging directory.
+    assert sorted(os.listdir(tmpdir)) == sorted(files)
+    for name, content in files.items():
+        with open(path.join(tmpdir, name), "rb") as fp:
+            assert fp.read() == content
+
+
+def test_interrupted_downloads_are_resumed(files: Dict[str, bytes], tmpdir):
+    body = archive(files)
+    full_path = path.join(tmpdir, ARCHIVE)
+    # The first two chunks were downloaded by a previous attempt.
+    with open(full_path, "wb") as fp:
+        fp.write(body[: 2 * CHUNK_SIZE])
+    with open(f"{full_path}.parts", "w") as fp:
+        state = {"size": len(body), "etag": '"v1"', "chunk_size": CHUNK_SIZE}
+        json.dump({**state, "done": [0, 1]}, fp)
+
+    with FakeFileServer({ARCHIVE: body}) as server:
+        download(ARCHIVE, str(tmpdir), server.url, chunk_size=CHUNK_SIZE)
+    requested = sorted(int(header[6:].split("-")[0]) for (_, header) in server.requests)
+    assert requested == list(range(2 * CHUNK_SIZE, len(body), CHUNK_SIZE))
+    with open(full_path, "rb") as fp:
+        assert fp.read() == body
+    assert os.listdir(tmpdir) == [ARCHIVE]
+
+
+def test_downloads_that_dont_match_the_checksum_are_removed(
+    files: Dict[str, bytes], tmpdir
+):
+    body = archive(files)
+    with FakeFileServer({ARCHIVE: body}) as server:
+        with pytest.raises(RuntimeError, match="sha256 checksum doesn't match"):
+            download(
+                ARCHIVE,
+                str(tmpdir),
+                server.url,
+                chunk_size=CHUNK_SIZE,
+                sha256=sha256(b"something else"),
+                extract_archive=True,
+            )
+    # The archive, the state file and the staging directory are removed, so
+    # that the next attempt starts over.
+    assert os.listdir(tmpdir) == []
+
+
+def test_servers_without_ranges_are_downloaded_at_once(files: Dict[str, bytes], tmpdir):
+    body = archive(files)
+    with FakeFileServer({ARCHIVE: body}, ranged=False) as server:
+        download(
+            ARCHIVE,
+            str(tmpdir),
+            server.url,
+            chunk_size=CHUNK_SIZE,
+            sha256=sha256(body),
+            extract_archive=True,
+        )
+    assert server.requests == [(f"/{ARCHIVE}", None)]
+    assert sorted(os.listdir(tmpdir)) == sorted(files)
@@ -0,0 +1,112 @@
+import io
+import json
+import pytest
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from app.data import InteractionIndex, InteractionId
+from app.export import export, export_all, ENT_TYPES
+
+
+def pages(
+    idx: InteractionIndex, ent_type: Optional[str], limit: int
+) -> Tuple[List[Dict], int]:
+    """
+    Exports the corpus a page at a time, and returns the records (without
+    those that describe each page) and the number of pages.
+    """
+    records: List[Dict] = []
+    cursor = None
+    count = 0
+    while True:
+        page = list(export(idx, cursor, ent_type, limit))
+        count += 1
+        *page_records, last = page
+        assert last["type"] == "page"
+        assert last["agents"] == len(
+            [record for record in page_records if record["type"] == "agent"]
+        )
+        records += page_records
+        cursor = last["next_cursor"]
+        if cursor is None:
+            return records, count
+
+
+def included(idx: InteractionIndex, ent_type: Optional[str]) -> List[str]:
+    return sorted(
+        agent.cui
+        for agent in idx.get_all_agents()
+        if ent_type is None or agent.ent_type == ent_type
+    )
+
+
+@pytest.mark.parametrize("ent_type", [None] + ENT_TYPES)
+@pytest.mark.parametrize("limit", [1, 2, 4, 100])
+def test_every_record_is_exported_once(
+    idx: InteractionIndex, ent_type: Optional[str], limit: int
+):
+    records, count = pages(idx, ent_type, limit)
+    cuis = included(idx, ent_type)
+    assert count == max(1, -(-len(cuis) // limit))
+
+    agents = [record["agent"].cui for record in records if record["type"] == "agent"]
+    assert agents == cuis
+
+    # Each interaction with an agent that's included is exported once, after
+    # one of its agents.
+    exported = Counter(
+        record["interaction_id"]
+        for record in records
+        if record["type"] == "interaction"
+    )
+    expected = [
+        str(iid)
+        for iid in idx.sentences_by_interaction_id
+        if any(cui in cuis for cui in iid.cuis)
+    ]
+    assert sorted(exported) == sorted(expected)
+    assert set(exported.values()) <= {1}
+    agent = None
+    for record in records:
+        if record["type"] == "agent":
+            agent = record["agent"]
+        else:
+            assert record["agents"][0] is agent
+            interaction_id = InteractionId.from_str(record["interaction_id"])
+            assert agent.cui in interaction_id.cuis
+            assert record["evidence"] == idx.get_evidence(interaction_id)
+
+
+def test_pages_that_end_on_the_last_agent_dont_have_a_cursor(idx: InteractionIndex):
+    cuis = included(idx, None)
+    *_, last = export(idx, None, None, len(cuis))
+    assert last == {"type": "page", "agents": len(cuis), "next_cursor": None}
+    *_, last = export(idx, None, None, len(cuis) - 1)
+    assert last["next_cursor"] == cuis[-2]
+    *_, last = export(idx, cuis[-2], None, 1)
+    assert last == {"type": "page", "agents": 1, "next_cursor": None}
+    *_, last = export(idx, cuis[-1], None, 1)
+    assert last == {"type": "page", "agents": 0, "next_cursor": None}
+
+
+def test_resumed_exports_are_appended(idx: InteractionIndex):
+    expected = io.StringIO()
+    export_all(idx, expected, page_size=2)
+    lines = expected.getvalue().splitlines()
+    records = [json.loads(line) for line in lines]
+
+    # The export is interrupted after the first page, and resumed from its
+    # cursor.
+    first_page_end = [record["type"] for record in records].index("page")
+    out = io.StringIO()
+    out.write("\n".join(lines[: first_page_end + 1]) + "\n")
+    export_all(idx, out, records[first_page_end]["next_cursor"], page_size=2)
+    assert out.getvalue() == expected.getvalue()
+
+    agents = [record["agent"]["cui"] for record in records if record["type"] == "agent"]
+    assert agents == included(idx, None)
+    interactions = [
+        record["interaction_id"]
+        for record in records
+        if record["type"] == "interaction"
+    ]
+    assert sorted(interactions) == sorted(map(str, idx.sentences_by_interaction_id))
@@ -0,0 +1,80 @@
+import pytest
+from itertools import product
+from typing import List, Tuple
+from app.data import InteractionIndex, EvidenceFilter
+from app.data import CLINICAL_STUDY, HUMAN_STUDY, ANIMAL_STUDY, RETRACTION
+from conftest import api_client
+
+FLAGS = [CLINICAL_STUDY, HUMAN_STUDY, ANIMAL_STUDY, RETRACTION]
+
+YEARS = [(None, None), (2006, None), (None, 2010), (2005, 2005), (2019, None)]
+
+
+def filters() -> List[EvidenceFilter]:
+    """
+    Returns a filter for each combination of flags (each one is either
+    required, excluded or neither) and range of years.
+    """
+    all_filters = []
+    for choices in product([None, "required", "excluded"], repeat=len(FLAGS)):
+        required = sum(
+            flag for flag, choice in zip(FLAGS, choices) if choice == "required"
+        )
+        excluded = sum(
+            flag for flag, choice in zip(FLAGS, choices) if choice == "excluded"
+        )
+        for min_year, max_year in YEARS:
+            all_filters.append(EvidenceFilter(required, excluded, min_year, max_year))
+    return all_filters
+
+
+def test_evidence_counts_match_the_evidence(idx: InteractionIndex):
+    for interaction_id, evidence_filter in product(
+        idx.sentences_by_interaction_id, filters()
+    ):
+        evidence = idx.get_evidence(interaction_id, evidence_filter)
+        assert idx.get_evidence_count(interaction_id, evidence_filter) == len(
+            evidence
+        ), (interaction_id, evidence_filter)
+        for item in evidence:
+            paper = item.paper
+            assert evidence_filter.matches(
+                idx.paper_flags_by_id[paper.pid], paper.year
+            ), (interaction_id, evidence_filter)
+
+
+def interactions(
+    query: str, idx: InteractionIndex
+) -> Tuple[int, List[Tuple[str, int]]]:
+    resp = api_client(idx).get(f"/agent/C0043031/interactions{query}")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    return (
+        body["total"],
+        [
+            (interaction["agent"]["cui"], len(interaction["evidence"]))
+            for interaction in body["interactions"]
+        ],
+    )
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("", (3, [("C0043481", 2), ("C0004057", 1), ("C0042890", 1)])),
+        # One of the papers about zinc was retracted, so it has less evidence.
+        (
+            "?retraction=false",
+            (3, [("C0004057", 1), ("C0042890", 1), ("C0043481", 1)]),
+        ),
+        ("?retraction=true", (1, [("C0043481", 1)])),
+        ("?year_min=2006", (3, [("C0004057", 1), ("C0042890", 1), ("C0043481", 1)])),
+        # Interactions without any evidence in range aren't included.
+        ("?year_min=2011", (2, [("C0004057", 1), ("C0042890", 1)])),
+        ("?year_min=2011&retraction=true", (0, [])),
+    ],
+)
+def test_filters_change_the_interactions(
+    idx: InteractionIndex, query: str, expected: Tuple[int, List[Tuple[str, int]]]
+):
+    assert interactions(query, idx) == expected
@@ -0,0 +1,91 @@
+import pytest
+import random
+from typing import Dict, List, Tuple
+from app.graph import InteractionGraph
+
+Adjacency = Dict[str, Dict[str, int]]
+
+
+def random_graph(seed: int) -> Tuple[List[str], List[Tuple[str, str, int]]]:
+    """
+    Returns the agents and edges of a small random graph. Some agents don't
+    have any edges, and some edges are self-loops, duplicates or reference
+    agents that aren't in the graph.
+    """
+    rng = random.Random(seed)
+    cuis = [f"C{i:07d}" for i in rng.sample(range(100), rng.randint(0, 12))]
+    candidates = cuis + ["C9999999"]
+    edges = []
+    if len(cuis) > 0:
+        for _ in range(rng.randint(0, 30)):
+            edges.append(
+                (rng.choice(candidates), rng.choice(candidates), rng.randint(1, 4))
+            )
+        edges += edges[: rng.randint(0, len(edges))]
+    return cuis, edges
+
+
+def adjacency(cuis: List[str], edges: List[Tuple[str, str, int]]) -> Adjacency:
+    neighbors: Adjacency = {cui: {} for cui in cuis}
+    for first, second, weight in edges:
+        if first in neighbors and second in neighbors and first != second:
+            neighbors[first][second] = neighbors[first].get(second, 0) + weight
+            neighbors[second][first] = neighbors[second].get(first, 0) + weight
+    return neighbors
+
+
+def top_neighbors(neighbors: Adjacency, cui: str, n: int) -> List[Tuple[str, int]]:
+    ranked = sorted(
+        neighbors.get(cui, {}).items(), key=lambda item: (-item[1], item[0])
+    )
+    return ranked[:n]
+
+
+def shared_neighbors(
+    neighbors: Adjacency, cuis: List[str]
+) -> List[Tuple[str, List[int]]]:
+    if len(cuis) == 0 or any(cui not in neighbors for cui in cuis):
+        return []
+    shared = set.intersection(*[set(neighbors[cui]) for cui in cuis])
+    weights = {other: [neighbors[cui][other] for cui in cuis] for other in shared}
+    return [
+        (other, weights[other])
+        for other in sorted(shared, key=lambda other: (-sum(weights[other]), other))
+    ]
+
+
+def two_hop_neighbors(neighbors: Adjacency, cui: str) -> List[Tuple[str, int, int]]:
+    if cui not in neighbors:
+        return []
+    direct = neighbors[cui]
+    paths: Dict[str, int] = {}
+    for other in direct:
+        for second in neighbors[other]:
+            if second != cui and second not in direct:
+                paths[second] = paths.get(second, 0) + 1
+    return [
+        (other, 1, weight)
+        for other, weight in top_neighbors(neighbors, cui, len(direct))
+    ] + [
+        (other, 2, count)
+        for other, count in sorted(paths.items(), key=lambda item: (-item[1], item[0]))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_the_graph_matches_its_adjacency(seed: int):
+    cuis, edges = random_graph(seed)
+    graph = InteractionGraph.build(cuis, edges)
+    neighbors = adjacency(cuis, edges)
+    assert graph.cuis == sorted(cuis)
+
+    queries = cuis + ["C9999999", "nope"]
+    rng = random.Random(seed)
+    for cui in queries:
+        assert graph.top_neighbors(cui, 3) == top_neighbors(neighbors, cui, 3)
+        assert graph.top_neighbors(cui, 100) == top_neighbors(neighbors, cui, 100)
+        assert graph.two_hop_neighbors(cui) == two_hop_neighbors(neighbors, cui)
+    for _ in range(20):
+        selected = rng.sample(queries, rng.randint(1, min(4, len(queries))))
+        assert graph.shared_neighbors(selected) == shared_neighbors(neighbors, selected)
+    assert graph.shared_neighbors([]) == []
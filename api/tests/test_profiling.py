@@ -0,0 +1,31 @@
+import json
+import tracemalloc
+from app import profiling
+from app.data import InteractionIndex
+from app.profiling import LoadProfiler
+
+
+def test_memory_isnt_traced_while_the_index_is_measured(
+    idx: InteractionIndex, monkeypatch, tmpdir
+):
+    deep_size = profiling.deep_size
+    tracing = []
+
+    def traced_deep_size(value):
+        tracing.append(tracemalloc.is_tracing())
+        return deep_size(value)
+
+    monkeypatch.setattr(profiling, "deep_size", traced_deep_size)
+    profiler = LoadProfiler()
+    with profiler.measure("agents"):
+        list(idx.get_all_agents())
+    report_path = str(tmpdir.join("profile.json"))
+    profiler.write(report_path, idx)
+
+    assert len(tracing) == len(profiling.PROFILED_STRUCTURES)
+    assert not any(tracing)
+    with open(report_path) as fp:
+        report = json.load(fp)
+    assert [phase["name"] for phase in report["phases"]] == ["agents"]
+    assert report["phases"][0]["tracemalloc_peak_bytes"] is not None
+    assert sorted(report["structures"]) == sorted(profiling.PROFILED_STRUCTURES)
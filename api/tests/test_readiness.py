@@ -0,0 +1,67 @@
+import pytest
+from flask import Flask, Response
+from app.progress import LoadProgress
+from app.readiness import LoadingApp
+
+
+def test_routes_are_unavailable_until_the_api_is_ready():
+    progress = LoadProgress(["agents", "api"])
+    loading_app = LoadingApp(progress)
+    client = Flask(__name__).test_client()
+    client.application.wsgi_app = loading_app  # type: ignore
+
+    assert client.get("/health/live").status_code == 200
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503
+    assert [phase["status"] for phase in resp.get_json()["phases"]] == [
+        "pending",
+        "pending",
+    ]
+    resp = client.get("/meta")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "5"
+
+    with progress.phase("agents"):
+        pass
+    with progress.phase("api"):
+        api = Flask(__name__)
+        api.add_url_rule("/meta", "meta", lambda: Response("{}", 200))
+    loading_app.serve(api)
+
+    assert client.get("/health/live").status_code == 200
+    resp = client.get("/health/ready")
+    assert resp.status_code == 200
+    assert [phase["status"] for phase in resp.get_json()["phases"]] == [
+        "complete",
+        "complete",
+    ]
+    assert client.get("/meta").status_code == 200
+
+
+def test_failures_in_a_phase_are_reported():
+    progress = LoadProgress(["agents", "api"])
+    client = Flask(__name__).test_client()
+    client.application.wsgi_app = LoadingApp(progress)  # type: ignore
+
+    with pytest.raises(RuntimeError):
+        with progress.phase("agents"):
+            raise RuntimeError("Duplicate cui: C0042890")
+
+    assert client.get("/health/live").status_code == 500
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503
+    assert resp.get_json()["phases"][0]["error"] == "Duplicate cui: C0042890"
+
+
+def test_failures_outside_of_a_phase_are_reported():
+    progress = LoadProgress(["agents", "api"])
+    client = Flask(__name__).test_client()
+    client.application.wsgi_app = LoadingApp(progress)  # type: ignore
+
+    # For instance, if SUPPAI_DATA_ARCHIVE isn't set.
+    progress.fail(KeyError("SUPPAI_DATA_ARCHIVE"))
+
+    assert client.get("/health/live").status_code == 500
+    resp = client.get("/health/ready")
+    assert resp.status_code == 503
+    assert resp.get_json()["error"] == "'SUPPAI_DATA_ARCHIVE'"
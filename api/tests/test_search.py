@@ -0,0 +1,134 @@
+from typing import List
+from app.data import Agent
+from app.search import AgentIndexSync, INDEX_SETTINGS
+from fakes import FakeSearchClient
+
+
+def agents(count: int) -> List[Agent]:
+    return [
+        Agent.from_json(
+            f"C{idx:07d}",
+            {
+                "preferred_name": f"Agent {idx}",
+                "synonyms": [f"synonym {idx}"],
+                "tradenames": [],
+                "definition": f"The definition of agent {idx}.",
+                "ent_type": "supplement" if idx % 2 == 0 else "drug",
+            },
+        )
+        for idx in range(count)
+    ]
+
+
+def saved(sync: AgentIndexSync) -> List[str]:
+    return [
+        object_id
+        for (method, object_ids) in sync.index.calls
+        if method == "save_objects"
+        for object_id in object_ids
+    ]
+
+
+def deleted(sync: AgentIndexSync) -> List[str]:
+    return [
+        object_id
+        for (method, object_ids) in sync.index.calls
+        if method == "delete_objects"
+        for object_id in object_ids
+    ]
+
+
+def test_sync_uploads_everything_once(tmp_path):
+    client = FakeSearchClient()
+    sync = AgentIndexSync(client, "agent_v1", str(tmp_path), batch_size=3)
+    result = sync.sync(agents(10))
+
+    assert (result.upserted, result.deleted, result.unchanged) == (10, 0, 0)
+    assert result.settings_updated
+    assert sorted(saved(sync)) == [agent.cui for agent in agents(10)]
+    assert ("set_settings", INDEX_SETTINGS) in sync.index.calls
+    # Batches are limited in size.
+    assert all(
+        len(object_ids) <= 3
+        for (method, object_ids) in sync.index.calls
+        if method == "save_objects"
+    )
+
+    # Syncing the same agents again doesn't send anything.
+    sync.index.calls.clear()
+    result = AgentIndexSync(client, "agent_v1", str(tmp_path)).sync(agents(10))
+    assert (result.upserted, result.deleted, result.unchanged) == (0, 0, 10)
+    assert not result.settings_updated
+    assert sync.index.calls == []
+
+
+def test_sync_uploads_only_changed_agents(tmp_path):
+    client = FakeSearchClient()
+    AgentIndexSync(client, "agent_v1", str(tmp_path)).sync(agents(10))
+
+    changed = agents(10)
+    changed[4] = changed[4]._replace(definition="A new definition.")
+    changed += agents(12)[10:]
+    sync = AgentIndexSync(client, "agent_v1", str(tmp_path))
+    sync.index.calls.clear()
+    result = sync.sync(changed)
+
+    assert (result.upserted, result.deleted, result.unchanged) == (3, 0, 9)
+    assert sorted(saved(sync)) == sorted(
+        [changed[4].cui, changed[10].cui, changed[11].cui]
+    )
+    assert sync.index.records[changed[4].cui]["definition"] == "A new definition."
+
+
+def test_sync_deletes_removed_agents(tmp_path):
+    client = FakeSearchClient()
+    AgentIndexSync(client, "agent_v1", str(tmp_path)).sync(agents(10))
+
+    remaining = agents(10)[:7]
+    sync = AgentIndexSync(client, "agent_v1", str(tmp_path), batch_size=2)
+    sync.index.calls.clear()
+    result = sync.sync(remaining)
+
+    assert (result.upserted, result.deleted, result.unchanged) == (0, 3, 7)
+    assert sorted(deleted(sync)) == [agent.cui for agent in agents(10)[7:]]
+    assert sorted(sync.index.records) == [agent.cui for agent in remaining]
+
+    # The deleted agents aren't deleted again by the next sync.
+    sync.index.calls.clear()
+    result = AgentIndexSync(client, "agent_v1", str(tmp_path)).sync(remaining)
+    assert (result.upserted, result.deleted, result.unchanged) == (0, 0, 7)
+    assert sync.index.calls == []
+
+
+def test_sync_recovers_state_from_the_index(tmp_path):
+    client = FakeSearchClient()
+    AgentIndexSync(client, "agent_v1", str(tmp_path / "first")).sync(agents(10))
+
+    # Without a state file, what was pushed is determined by browsing the
+    # index. Only the differences are sent.
+    changed = agents(9)
+    changed[0] = changed[0]._replace(preferred_name="Renamed")
+    sync = AgentIndexSync(client, "agent_v1", str(tmp_path / "second"))
+    state = sync.remote_state()
+    assert sorted(state.records) == [agent.cui for agent in agents(10)]
+
+    sync.index.calls.clear()
+    result = sync.sync(changed)
+    assert (result.upserted, result.deleted, result.unchanged) == (1, 1, 8)
+    assert not result.settings_updated
+    assert saved(sync) == [changed[0].cui]
+    assert deleted(sync) == [agents(10)[9].cui]
+
+    # The recovered state is saved, so the next sync doesn't browse again.
+    assert (tmp_path / "second" / "agent_v1.json").exists()
+    assert sync.load_state() == sync.remote_state()
+
+
+def test_sync_without_state_or_index_uploads_everything():
+    client = FakeSearchClient()
+    sync = AgentIndexSync(client, "agent_v1")
+    assert sync.remote_state().records == {}
+
+    result = sync.sync(agents(4))
+    assert (result.upserted, result.deleted, result.unchanged) == (4, 0, 0)
+    assert result.settings_updated
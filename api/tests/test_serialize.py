@@ -0,0 +1,149 @@
+import pytest
+import simplejson
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from app import api
+from app.data import InteractionIndex, INTERACTION_SORTS
+from app.search import AgentIndexSync
+from app.serialize import Encoder
+from conftest import api_client
+from fakes import FakeSearchClient
+
+
+class SimplejsonEncoder:
+    """
+    Encodes values the way the API did before `app.serialize.Encoder`, which
+    is what its output is compared to.
+    """
+
+    def __init__(self, memoized: Any = ()):
+        pass
+
+    def dumps(self, value: Any) -> str:
+        return simplejson.dumps(value)
+
+    def dump(self, value: Any, write: Any) -> None:
+        write(simplejson.dumps(value))
+
+
+def urls(idx: InteractionIndex) -> List[str]:
+    """
+    Returns URLs for every route, with each of the parameters they accept.
+    """
+    cuis = sorted(idx.agents_by_cui)
+    urls = [
+        "/meta",
+        "/agent/NOPE",
+        "/agent/NOPE/interactions",
+        "/agent/search?q=a",
+        "/agent/search?q=a&p=1",
+        "/agent/search?q=nothing",
+        "/agent/suggest?q=w",
+        "/agent/suggest?q=zinc&s=2",
+        "/agent/suggest",
+        f"/agent/shared?cui={cuis[0]}&cui={cuis[1]}",
+        f"/agent/shared?cui={cuis[0]}&cui={cuis[1]}&cui={cuis[2]}",
+        f"/agent/shared?cui={cuis[0]}",
+        "/export",
+        "/export?limit=2",
+        f"/export?limit=2&cursor={cuis[1]}",
+        "/export?ent_type=drug",
+        "/export?ent_type=nope",
+    ]
+    for cui in cuis:
+        interactions = f"/agent/{cui}/interactions"
+        urls += [
+            f"/agent/{cui}",
+            interactions,
+            f"{interactions}?p=2",
+            f"{interactions}?p=x",
+            f"{interactions}?q=w",
+            f"{interactions}?clinical_study=true",
+            f"{interactions}?human_study=true&retraction=false",
+            f"{interactions}?animal_study=false&year_min=2006&year_max=2020",
+            f"{interactions}?year_min=x",
+            f"{interactions}?sort=nope",
+            f"/agent/{cui}/neighbors",
+            f"/agent/{cui}/neighbors?n=1",
+            f"/agent/{cui}/neighbors?n=0",
+            f"/agent/{cui}/neighbors/two-hop",
+        ]
+        urls += [f"{interactions}?sort={sort}" for sort in INTERACTION_SORTS]
+    for interaction_id in sorted(map(str, idx.sentences_by_interaction_id)):
+        urls += [
+            f"/interaction/{interaction_id}",
+            f"/interaction/{interaction_id}?retraction=false",
+            f"/interaction/{interaction_id}?human_study=true&year_min=2000",
+        ]
+    for paper_id in sorted(idx.sentence_refs_by_paper_id) + ["nope"]:
+        urls += [f"/paper/{paper_id}", f"/paper/{paper_id}?p=2"]
+    return urls
+
+
+def responses(idx: InteractionIndex) -> Dict[str, Tuple[int, bytes]]:
+    client = api_client(idx)
+    return {
+        url: (resp.status_code, resp.get_data())
+        for url, resp in ((url, client.get(url)) for url in urls(idx))
+    }
+
+
+def test_responses_match_simplejson(
+    idx: InteractionIndex, search_client: FakeSearchClient, monkeypatch
+):
+    AgentIndexSync(search_client, idx.index_name).sync(idx.get_all_agents())
+
+    with monkeypatch.context() as patched:
+        patched.setattr(api, "Encoder", SimplejsonEncoder)
+        expected = responses(idx)
+    actual = responses(idx)
+
+    assert actual.keys() == expected.keys()
+    for url in expected:
+        assert actual[url] == expected[url], url
+
+    # Make sure the routes did something interesting.
+    statuses = [status for (status, _) in expected.values()]
+    assert statuses.count(200) > len(statuses) / 2
+    assert 400 in statuses and 404 in statuses
+
+
+class Point(NamedTuple):
+    x: int
+    label: Optional[str]
+
+
+class Empty(NamedTuple):
+    pass
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        -12,
+        2 ** 70,
+        1.5,
+        "",
+        'quotes " and \\ backslashes',
+        "unicode é 紫锥菊 \U0001f48a and control \n\t\x00 characters",
+        [],
+        (),
+        {},
+        [1, "two", None, [3.0]],
+        {"a": 1, "b": [True, {"c": None}]},
+        {1: "integer keys", 2: None},
+        {"named": Point(1, "one"), "empty": Empty()},
+        [Point(2, None), Point(3, "three")],
+    ],
+)
+def test_values_match_simplejson(value: Any):
+    encoder = Encoder(memoized=[Point])
+    chunks: List[str] = []
+    encoder.dump(value, chunks.append)
+    assert encoder.dumps(value) == simplejson.dumps(value)
+    assert "".join(chunks) == simplejson.dumps(value)
+    # Memoized values are encoded the same way the second time.
+    assert encoder.dumps(value) == simplejson.dumps(value)
@@ -0,0 +1,93 @@
+import json
+import shutil
+import simplejson
+from os import path
+from typing import List
+from app.data import InteractionIndex, InteractingAgent, Agent
+from conftest import DATA_ARCHIVE, DATA_DIR
+from fakes import FakeSearchClient
+
+
+def old_get_interactions(idx: InteractionIndex, agent: Agent) -> List[InteractingAgent]:
+    """
+    The way `InteractionIndex.get_interactions` ordered interactions before
+    the orderings were computed when the index is loaded.
+    """
+    interactions = []
+    # It used to raise a KeyError for agents without any interactions.
+    for interaction_id in idx.interaction_ids_by_cui.get(agent.cui, []):
+        [other] = [cui for cui in interaction_id.cuis if cui != agent.cui]
+        interacting_agent = idx.get_agent(other)
+        if interacting_agent is not None:
+            interactions.append(
+                InteractingAgent(
+                    str(interaction_id),
+                    idx.get_interaction_id_slug(interaction_id),
+                    interacting_agent,
+                    idx.get_evidence(interaction_id),
+                )
+            )
+    return sorted(
+        interactions,
+        key=lambda intr: (-1 * len(intr.evidence), intr.agent.preferred_name),
+    )
+
+
+def reordered(data_dir: str) -> InteractionIndex:
+    """
+    Returns an index for a copy of the fixture where the interactions of
+    warfarin (C0043031) are in a different order for each sort:
+
+    - zinc has the most evidence, from 2005 and 2010, neither of it clinical;
+    - aspirin has evidence from 2018, which isn't clinical;
+    - vitamin D has evidence from a clinical study without a year.
+    """
+    shutil.copytree(DATA_DIR, data_dir)
+    with open(path.join(data_dir, "paper_metadata.json")) as fp:
+        papers = json.load(fp)
+    papers["p1"]["clinical_study"] = False
+    papers["p4"]["clinical_study"] = True
+    with open(path.join(data_dir, "paper_metadata.json"), "w") as fp:
+        json.dump(papers, fp)
+    with open(path.join(data_dir, "sentence_dict.json")) as fp:
+        sentences = json.load(fp)
+    [sentence] = sentences["C0042890-C0043031"]
+    sentence["paper_id"] = "p4"
+    sentence["sentence_id"] = 5
+    with open(path.join(data_dir, "sentence_dict.json"), "w") as fp:
+        json.dump(sentences, fp)
+    return InteractionIndex.from_data(DATA_ARCHIVE, data_dir)
+
+
+def names(idx: InteractionIndex, cui: str, sort: str) -> List[str]:
+    agent = idx.get_agent(cui)
+    assert agent is not None
+    return [
+        interaction.agent.preferred_name
+        for interaction in idx.get_interactions(agent, sort=sort)
+    ]
+
+
+def test_interactions_are_sorted(search_client: FakeSearchClient, tmpdir):
+    idx = reordered(str(tmpdir.join("data")))
+    assert names(idx, "C0043031", "evidence") == ["Zinc", "Aspirin", "Vitamin D"]
+    # Interactions without a year are last.
+    assert names(idx, "C0043031", "recent") == ["Aspirin", "Zinc", "Vitamin D"]
+    # Ties are ordered by the amount of evidence.
+    assert names(idx, "C0043031", "clinical") == ["Vitamin D", "Zinc", "Aspirin"]
+    assert names(idx, "C0043031", "name") == ["Aspirin", "Vitamin D", "Zinc"]
+    # Names are compared in lower case, by code point.
+    assert names(idx, "C0004057", "name") == ["Vitamin D", "Warfarin", "Échinacée"]
+
+
+def test_the_evidence_order_is_unchanged(
+    idx: InteractionIndex, search_client: FakeSearchClient, tmpdir
+):
+    for index in [idx, reordered(str(tmpdir.join("data")))]:
+        for agent in index.get_all_agents():
+            assert simplejson.dumps(index.get_interactions(agent)) == simplejson.dumps(
+                old_get_interactions(index, agent)
+            )
+            assert simplejson.dumps(
+                index.get_interactions(agent, sort="evidence")
+            ) == simplejson.dumps(old_get_interactions(index, agent))
@@ -3,6 +3,13 @@
 import requests
 import time
 import math
+import os
+import sys
+import json
+import random
+import argparse
+import threading
+from urllib.parse import quote
 
 def is_ok(url: str) -> bool:
     """
@@ -53,5 +60,333 @@ def scan():
     print("⛵️ Smooth sailing!")
     print("")
 
+# The routes that are probed, and the path of each. The paths are filled in
+# with agents and interactions that are discovered before the probe starts.
+ROUTES = {
+    "agent": lambda targets: "/agent/%s" % random.choice(targets.cuis),
+    "interactions": lambda targets: (
+        "/agent/%s/interactions" % random.choice(targets.cuis)
+    ),
+    "interaction": lambda targets: "/interaction/%s" % random.choice(targets.iids),
+    "suggest": lambda targets: (
+        "/agent/suggest?q=%s" % quote(random.choice(targets.queries))
+    ),
+}
+
+DEFAULT_MIX = "agent=4,interactions=3,interaction=2,suggest=1"
+
+# The API caches responses, so a request is either "warm" (sent from the
+# cache) or "cold" (computed by the route). Cold requests ask the API to
+# bypass its cache, which is the only way to measure the cost of a route
+# once the agents being probed have been requested. The API only does so
+# for requests with this header, set to the token it's configured with.
+CACHES = ("warm", "cold")
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+class Targets:
+    """
+    The agents and interactions that requests are made for, and the queries
+    that are used for suggestions.
+    """
+    def __init__(self, cuis, iids, queries):
+        self.cuis = cuis
+        self.iids = iids
+        self.queries = queries
+
+def discover(origin: str, cuis: list, limit: int) -> Targets:
+    """
+    Returns the agents and interactions to make requests for. Unless agents
+    are provided, they're discovered via the API's export, along with their
+    interactions. Otherwise the interactions of the provided agents are used.
+    """
+    iids = []
+    names = []
+    if len(cuis) == 0:
+        resp = requests.get(
+            "%s/export" % origin, params={ "limit": limit }, stream=True,
+            timeout=60
+        )
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            record = json.loads(line)
+            if record["type"] == "agent":
+                cuis.append(record["agent"]["cui"])
+                names.append(record["agent"]["preferred_name"])
+            elif record["type"] == "interaction":
+                iids.append(record["interaction_id"])
+        resp.close()
+    else:
+        for cui in cuis:
+            resp = requests.get("%s/agent/%s/interactions" % (origin, cui), timeout=60)
+            resp.raise_for_status()
+            for interaction in resp.json()["interactions"]:
+                iids.append(interaction["interaction_id"])
+                names.append(interaction["agent"]["preferred_name"])
+    if len(cuis) == 0 or len(iids) == 0:
+        raise RuntimeError("No agents or interactions to probe were found.")
+    # Suggestions are requested as a user would type them, so we use the
+    # first few characters of each name.
+    queries = [ name[:random.randint(3, 8)].lower() for name in names ]
+    return Targets(cuis, iids, queries)
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        route, _, weight = part.partition("=")
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError("Unknown route: %s" % route)
+        weights[route] = float(weight) if weight != "" else 1.0
+    return weights
+
+def parse_budget(budget: str) -> tuple:
+    """
+    Parses a latency budget, like "interactions:p95=250" (milliseconds). The
+    route can be "*", which applies the budget to every route. It can be
+    followed by ".cold" or ".warm", like "interactions.cold:p95=1000", to
+    only apply the budget to cold or warm requests.
+    """
+    target, _, rest = budget.partition(":")
+    route, _, cache = target.partition(".")
+    stat, _, limit = rest.partition("=")
+    if route != "*" and route not in ROUTES:
+        raise ValueError("Unknown route: %s" % route)
+    if cache != "" and cache not in CACHES:
+        raise ValueError("Unknown cache: %s" % cache)
+    if stat not in ("p50", "p95", "p99", "max"):
+        raise ValueError("Unknown statistic: %s" % stat)
+    return (route, cache, stat, float(limit))
+
+def percentile(latencies: list, p: float) -> float:
+    """
+    Returns the pth percentile of the provided (sorted) latencies, using the
+    nearest rank.
+    """
+    if len(latencies) == 0:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(latencies)))
+    return latencies[rank - 1]
+
+class Samples:
+    """
+    The latency of each request that's made, grouped by route and whether
+    it was cold or warm, like "interactions.cold".
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route: str, cache: str, latency: float, ok: bool):
+        key = "%s.%s" % (route, cache)
+        with self.lock:
+            if ok:
+                self.latencies.setdefault(key, []).append(latency)
+            else:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies.get(route, []))
+            errors = self.errors.get(route, 0)
+            routes[route] = {
+                "requests": len(latencies) + errors,
+                "errors": errors,
+                "rps": round((len(latencies) + errors) / elapsed, 2),
+                "p50": round(percentile(latencies, 50), 2),
+                "p95": round(percentile(latencies, 95), 2),
+                "p99": round(percentile(latencies, 99), 2),
+                "max": round(latencies[-1] if len(latencies) > 0 else 0.0, 2),
+            }
+        total = sum(route["requests"] for route in routes.values())
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": total,
+            "rps": round(total / elapsed, 2),
+            "routes": routes,
+        }
+
+def probe(origin: str, targets: Targets, mix: dict, workers: int,
+          duration: float, timeout: float, cold: float,
+          bypass_token: str) -> dict:
+    """
+    Makes requests to a weighted mix of routes from several workers at once,
+    for the provided duration, and returns the throughput and latency (in
+    milliseconds) of each route. The provided fraction of requests are cold,
+    and they're reported separately.
+    """
+    samples = Samples()
+    routes = list(mix)
+    weights = [ mix[route] for route in routes ]
+    started = time.perf_counter()
+    deadline = started + duration
+
+    def work():
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            [route] = random.choices(routes, weights)
+            url = origin + ROUTES[route](targets)
+            cache = "cold" if random.random() < cold else "warm"
+            headers = { CACHE_BYPASS_HEADER: bypass_token } if cache == "cold" else {}
+            start = time.perf_counter()
+            try:
+                resp = session.get(url, headers=headers, timeout=timeout)
+                ok = math.floor(resp.status_code / 100) == 2
+            except requests.RequestException:
+                ok = False
+            samples.record(route, cache, (time.perf_counter() - start) * 1000, ok)
+
+    threads = [ threading.Thread(target=work, daemon=True) for _ in range(workers) ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples.report(time.perf_counter() - started)
+
+def print_report(report: dict):
+    print("")
+    print(
+        "%-18s %9s %7s %9s %9s %9s %9s %9s" %
+        ("route", "requests", "errors", "req/s", "p50 ms", "p95 ms", "p99 ms", "max ms")
+    )
+    for route, stats in report["routes"].items():
+        print(
+            "%-18s %9d %7d %9.1f %9.1f %9.1f %9.1f %9.1f" %
+            (route, stats["requests"], stats["errors"], stats["rps"],
+             stats["p50"], stats["p95"], stats["p99"], stats["max"])
+        )
+    print("")
+    print(
+        "%d requests in %.1fs, %.1f req/s" %
+        (report["requests"], report["elapsed_seconds"], report["rps"])
+    )
+    print("")
+
+def check_budgets(report: dict, budgets: list, max_error_rate: float) -> list:
+    """
+    Returns a description of each budget that the report exceeds.
+    """
+    violations = []
+    for key, stats in report["routes"].items():
+        route, _, cache = key.partition(".")
+        for (budget_route, budget_cache, stat, limit) in budgets:
+            if (
+                budget_route in ("*", route) and budget_cache in ("", cache)
+                and stats[stat] > limit
+            ):
+                violations.append(
+                    "%s %s is %.1fms, the budget is %.1fms" %
+                    (key, stat, stats[stat], limit)
+                )
+        error_rate = stats["errors"] / stats["requests"]
+        if error_rate > max_error_rate:
+            violations.append(
+                "%s error rate is %.3f, the budget is %.3f" %
+                (key, error_rate, max_error_rate)
+            )
+    return violations
+
+def run_probe(args) -> int:
+    try:
+        mix = parse_mix(args.mix)
+        budgets = [ parse_budget(budget) for budget in args.budget ]
+    except ValueError as err:
+        print("💥 %s" % err)
+        return 2
+    if args.cold < 0 or args.cold > 1:
+        print("💥 --cold must be between 0 and 1")
+        return 2
+    if args.cold > 0 and not args.cache_bypass_token:
+        print("💥 --cache-bypass-token is required for cold requests, or use --cold 0")
+        return 2
+
+    origin = args.origin.rstrip("/")
+    targets = discover(origin, list(args.cui), args.discover)
+    print(
+        "🔭 Probing %s with %d workers for %ds, using %d agents and %d interactions" %
+        (origin, args.workers, args.duration, len(targets.cuis), len(targets.iids))
+    )
+    report = probe(
+        origin, targets, mix, args.workers, args.duration, args.timeout, args.cold,
+        args.cache_bypass_token
+    )
+    print_report(report)
+    if args.json is not None:
+        with open(args.json, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    violations = check_budgets(report, budgets, args.max_error_rate)
+    for violation in violations:
+        print("💥 %s" % violation)
+    if len(violations) > 0:
+        return 1
+    print("✨ Within budget")
+    return 0
+
 if __name__ == "__main__":
-    scan()
+    parser = argparse.ArgumentParser(
+        description="Without any arguments, waits for the local environment " +
+            "to be ready. The probe command measures the API's latency."
+    )
+    commands = parser.add_subparsers(dest="command")
+    probe_parser = commands.add_parser(
+        "probe", help="Measures the throughput and latency of the API's routes."
+    )
+    probe_parser.add_argument(
+        "--origin", help="The origin of the API.", default="http://api:8000"
+    )
+    probe_parser.add_argument(
+        "--mix", help="The routes to request, and the weight of each.",
+        default=DEFAULT_MIX
+    )
+    probe_parser.add_argument(
+        "--workers", help="The number of concurrent requests.", type=int,
+        default=16
+    )
+    probe_parser.add_argument(
+        "--duration", help="How long to probe for, in seconds.", type=float,
+        default=30
+    )
+    probe_parser.add_argument(
+        "--timeout", help="The timeout for each request, in seconds.",
+        type=float, default=10
+    )
+    probe_parser.add_argument(
+        "--cui", help="An agent to make requests for. If none are provided " +
+            "they're discovered via the API's export.", action="append",
+        default=[]
+    )
+    probe_parser.add_argument(
+        "--discover", help="The number of agents to discover.", type=int,
+        default=200
+    )
+    probe_parser.add_argument(
+        "--cold", help="The fraction of requests that bypass the API's " +
+            "response cache, which measures the cost of each route. They're " +
+            "reported separately from the rest.", type=float, default=0.5
+    )
+    probe_parser.add_argument(
+        "--cache-bypass-token", help="The token that the API accepts for " +
+            "requests that bypass its cache (SUPP_AI_CACHE_BYPASS_TOKEN).",
+        default=os.environ.get("SUPP_AI_CACHE_BYPASS_TOKEN")
+    )
+    probe_parser.add_argument(
+        "--budget", help="A latency budget, in milliseconds, that fails the " +
+            "probe when exceeded, i.e. \"interactions:p95=250\", " +
+            "\"interactions.cold:p95=1000\" or \"*:p99=1000\".",
+        action="append", default=[]
+    )
+    probe_parser.add_argument(
+        "--max-error-rate", help="The fraction of requests to a route that " +
+            "can fail before the probe fails.", type=float, default=0.0
+    )
+    probe_parser.add_argument(
+        "--json", help="A file to write the report to, as JSON.", default=None
+    )
+    args = parser.parse_args()
+
+    if args.command == "probe":
+        sys.exit(run_probe(args))
+    else:
+        scan()